@@ -15,3 +15,4 @@ admin.site.register(Task)
 admin.site.register(TaskMember)
 admin.site.register(SubTask)
 admin.site.register(TaskDependency)
+admin.site.register(OutgoingEmail)
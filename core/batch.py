@@ -0,0 +1,219 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Max
+
+from core.broker import publish_event
+from core.closure import prepare_task_removal, remove_dependency_edge
+from core.models import Task, TaskMember, TeamMember, ProjectMember, Project, Update
+from core.ordering import next_index, TASK_INDEX_GAP
+from core.serializers import TaskSerializer
+from core.signals import bulk_task_deletion
+from core.stats import task_stat_deltas, apply_stat_deltas, assignee_stat_key, remember_stat_values, \
+    lock_stat_values
+from core.utils import split_ids, touch_project
+
+BATCH_MAX_OPERATIONS = 500
+BATCH_OPERATIONS = ('create', 'update', 'delete')
+
+
+class TaskOperation:
+    def __init__(self, kind, task=None, data=None, members=None):
+        self.kind = kind
+        self.task = task
+        self.data = data or {}
+        self.members = members
+
+
+def _eligible_members(project, user_ids):
+    members = TeamMember.objects.filter(workspace_id=project.workspace_id, member_id__in=user_ids)
+    if project.is_private:
+        members = members.filter(Exists(ProjectMember.objects.filter(project=project, member_id=OuterRef('member_id'))))
+    return set(members.values_list('member_id', flat=True))
+
+
+def parse_task_batch(project, operations):
+    """
+    Validates every operation of a batch before anything is written, with one query for the tasks and one for the
+    members. Returns the operations and the error of each of them (None when it is valid).
+    """
+    task_ids, _ = split_ids(operation.get('id') for operation in operations
+                            if isinstance(operation, dict) and operation.get('op') in ('update', 'delete'))
+    tasks = {task.id: task for task in Task.objects.filter(project=project, id__in=task_ids)}
+    member_ids, _ = split_ids(member_id for operation in operations
+                              if isinstance(operation, dict) and isinstance(operation.get('members'), list)
+                              for member_id in operation['members'])
+    eligible = _eligible_members(project, member_ids) if member_ids else set()
+
+    parsed, errors, seen = [], [], set()
+    for operation in operations:
+        kind = operation.get('op') if isinstance(operation, dict) else None
+        if kind not in BATCH_OPERATIONS:
+            parsed.append(None)
+            errors.append({'op': f'Expected one of {", ".join(BATCH_OPERATIONS)}'})
+            continue
+
+        task = None
+        if kind != 'create':
+            task = tasks.get(operation.get('id')) if isinstance(operation.get('id'), int) else None
+            if task is None:
+                parsed.append(None)
+                errors.append({'id': 'Invalid task id'})
+                continue
+            if task.id in seen:
+                parsed.append(None)
+                errors.append({'id': 'Task appears in more than one operation'})
+                continue
+            seen.add(task.id)
+
+        members = operation.get('members')
+        if members is not None and kind != 'delete':
+            ids, invalid = split_ids(members) if isinstance(members, list) else ([], [members])
+            if invalid or not eligible.issuperset(ids):
+                parsed.append(None)
+                errors.append({'members': 'Invalid member ids'})
+                continue
+            members = set(ids)
+
+        data = {}
+        if kind != 'delete':
+            fields = operation.get('data') or {}
+            if not isinstance(fields, dict):
+                parsed.append(None)
+                errors.append({'data': 'Expected an object'})
+                continue
+            fields = {key: value for key, value in fields.items() if key != 'project'}
+            serializer = TaskSerializer(task, data=fields, partial=kind == 'update')
+            if not serializer.is_valid():
+                parsed.append(None)
+                errors.append(serializer.errors)
+                continue
+            data = serializer.validated_data
+
+        parsed.append(TaskOperation(kind, task, data, members))
+        errors.append(None)
+    return parsed, errors
+
+
+def _bulk_create_tasks(project, tasks):
+    if not tasks or connection.features.can_return_rows_from_bulk_insert:
+        Task.objects.bulk_create(tasks)
+        return
+    # Without ids from the insert (SQLite), the rows of the locked project past the previous last id are ours
+    last_id = Task.objects.aggregate(Max('id'))['id__max'] or 0
+    Task.objects.bulk_create(tasks)
+    ids = list(Task.objects.filter(project=project, id__gt=last_id).order_by('id').values_list('id', flat=True))
+    assert len(ids) == len(tasks), 'Inserted tasks cannot be told apart from concurrent ones'
+    for task, task_id in zip(tasks, ids):
+        task.id = task_id
+
+
+def _set_members(operations):
+    operations = [operation for operation in operations if operation.members is not None]
+    if not operations:
+        return
+    current = {}
+    for member in TaskMember.objects.filter(task__in=[operation.task for operation in operations]):
+        current.setdefault(member.task_id, {})[member.member_id] = member.id
+
+    removed, added = [], []
+    for operation in operations:
+        assigned = current.get(operation.task.id, {})
+        removed += [member_id for user_id, member_id in assigned.items() if user_id not in operation.members]
+        added += [TaskMember(task=operation.task, member_id=user_id)
+                  for user_id in operation.members if user_id not in assigned]
+    TaskMember.objects.filter(id__in=removed).delete()
+    TaskMember.objects.bulk_create(added)
+    apply_stat_deltas(assignee_deltas=Counter(
+        assignee_stat_key(member.task.project_id, member.member_id, member.task.column) for member in added
+    ))
+
+
+def apply_task_batch(project, user, operations):
+    """
+    Writes validated operations in one transaction, with one bulk statement per kind of write, and records a single
+    Update for the whole batch. Returns the created, updated and deleted tasks.
+    """
+    created = [operation for operation in operations if operation.kind == 'create']
+    updated = [operation for operation in operations if operation.kind == 'update']
+    deleted = [operation.task for operation in operations if operation.kind == 'delete']
+
+    with transaction.atomic():
+        Project.objects.select_for_update().filter(pk=project.id).first()
+        last_indexes = {}
+
+        def allocate_index(column):
+            if column not in last_indexes:
+                last_indexes[column] = next_index(project.id, column) - TASK_INDEX_GAP
+            last_indexes[column] += TASK_INDEX_GAP
+            return last_indexes[column]
+
+        for operation in created:
+            operation.task = Task(project=project, **operation.data)
+            if operation.task.index is None:
+                operation.task.index = allocate_index(operation.task.column)
+        _bulk_create_tasks(project, [operation.task for operation in created])
+
+        task_deltas, assignee_deltas = Counter(), Counter()
+        for operation in created:
+            task_deltas.update(task_stat_deltas(operation.task, created=True)[0])
+
+        # Deleted tasks are locked too, so that their deletion counts them where the last concurrent write left them
+        lock_stat_values([operation.task for operation in updated] + deleted)
+        assignees = {}
+        for member in TaskMember.objects.filter(task__in=[operation.task for operation in updated] + deleted):
+            assignees.setdefault(member.task_id, []).append(member.member_id)
+
+        fields, moved = set(), 0
+        for operation in updated:
+            task = operation.task
+            column = task.column
+            for field, value in operation.data.items():
+                setattr(task, field, value)
+                fields.add(field)
+            if task.column != column:
+                moved += 1
+                if 'index' not in operation.data:
+                    task.index = allocate_index(task.column)
+                    fields.add('index')
+            changes = task_stat_deltas(task, member_ids=assignees.get(task.id, []))
+            task_deltas.update(changes[0])
+            assignee_deltas.update(changes[1])
+        for task in deleted:
+            task_deltas.update(task_stat_deltas(task, deleted=True)[0])
+            assignee_deltas.subtract(assignee_stat_key(task.project_id, member_id, task.column)
+                                     for member_id in assignees.get(task.id, []))
+        if fields:
+            Task.objects.bulk_update([operation.task for operation in updated], fields)
+        apply_stat_deltas(task_deltas, assignee_deltas)
+        for operation in created + updated:
+            remember_stat_values(operation.task)
+
+        if deleted:
+            deleted_ids = {task.id for task in deleted}
+            above, below = prepare_task_removal(deleted_ids)
+            # The whole set is accounted for above and below, not by the handlers of every deleted row
+            with bulk_task_deletion():
+                Task.objects.filter(id__in=deleted_ids).delete()
+            if above and below:
+                remove_dependency_edge(above, below)
+        _set_members(created + updated)
+
+        touch_project(pk=project.id)
+        summary = [f'{count} {label}' for count, label in
+                   ((len(created), 'created'), (len(updated), 'updated'), (moved, 'moved'), (len(deleted), 'deleted'))
+                   if count]
+        update = Update()
+        update.workspace_id = project.workspace_id
+        update.message = f'Tasks for Project {project.name} changed by {user.user_name}: {", ".join(summary)}'
+        update.save()
+
+        created = [operation.task for operation in created]
+        updated = [operation.task for operation in updated]
+        publish_event(project.workspace_id, 'tasks', {
+            'project': project.id,
+            'created': [task.id for task in created],
+            'updated': [task.id for task in updated],
+            'deleted': [task.id for task in deleted],
+        })
+    return created, updated, deleted
@@ -0,0 +1,42 @@
+from core.models import Task, TaskMember, TaskDependency
+from user.models import PrismUser
+
+BOARD_TASK_FIELDS = ('id', 'name', 'column', 'index', 'created', 'deadline', 'priority', 'duration',
+                     'subtasks_done', 'subtasks_total')
+BOARD_USER_FIELDS = ('id', 'user_name', 'email', 'first_name', 'last_name')
+
+
+def build_board(project):
+    """
+    Column grouped snapshot of a project board, built from flat rows.
+    Task members are referenced by id and listed once in the `users` table.
+    """
+    columns = {column: [] for column, _ in Task.COLUMN_OPTIONS}
+    tasks = {}
+    for task in Task.objects.filter(project=project).order_by('column', 'index').values(*BOARD_TASK_FIELDS):
+        task['members'] = []
+        task['dependencies'] = []
+        tasks[task['id']] = task
+        columns.setdefault(task.pop('column'), []).append(task)
+
+    # Rows of tasks created after the first query are skipped rather than failing the snapshot
+    member_ids = set()
+    for task_id, member_id in TaskMember.objects.filter(task__project=project).values_list('task_id', 'member_id'):
+        if task_id in tasks:
+            tasks[task_id]['members'].append(member_id)
+            member_ids.add(member_id)
+
+    dependencies = TaskDependency.objects.filter(task__project=project).values_list('task_id', 'dependency_id')
+    for task_id, dependency_id in dependencies:
+        if task_id in tasks:
+            tasks[task_id]['dependencies'].append(dependency_id)
+
+    users = {}
+    if member_ids:
+        users = {user['id']: user for user in PrismUser.objects.filter(id__in=member_ids).values(*BOARD_USER_FIELDS)}
+
+    return {
+        'project': project.id,
+        'columns': columns,
+        'users': users,
+    }
@@ -0,0 +1,132 @@
+import abc
+import asyncio
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+def workspace_channel(workspace_id):
+    return f'workspace:{workspace_id}'
+
+
+class Subscription:
+    """
+    Events of one channel for one listener, consumed from the event loop that opened it.
+    A listener that falls `max_pending` events behind is closed, it is expected to reconnect and refetch.
+    """
+
+    def __init__(self, broker, channel, max_pending):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.closed = False
+
+    def deliver(self, event):
+        # Runs on self.loop
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.close()
+
+    async def get(self, timeout=None):
+        """
+        Next event, None once the subscription is closed. Raises asyncio.TimeoutError after `timeout` seconds.
+        """
+        if self.closed and self.queue.empty():
+            return None
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class BaseBroker(abc.ABC):
+    max_pending = 1000
+
+    @abc.abstractmethod
+    def publish(self, channel, event):
+        pass
+
+    @abc.abstractmethod
+    def subscribe(self, channel):
+        pass
+
+    @abc.abstractmethod
+    def unsubscribe(self, subscription):
+        pass
+
+
+class InMemoryBroker(BaseBroker):
+    """
+    Fans events out to the listeners of this process only. Publishing is thread safe, so WSGI threads and
+    sync_to_async workers can publish to listeners running on the ASGI event loop.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The loop of the listener is gone
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.max_pending)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[subscription.channel]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.EVENT_BROKER)()
+    return _broker
+
+
+ACCESS_CHANGED = 'access'
+
+
+def publish_event(workspace_id, kind, data):
+    """
+    Publishes an event to the listeners of a workspace once the current transaction commits.
+    """
+    event = {'type': kind, 'data': data}
+    transaction.on_commit(lambda: get_broker().publish(workspace_channel(workspace_id), event))
+
+
+def publish_access_change(workspace_id, member_ids=None):
+    """
+    Tells the event streams of `member_ids` (all when None) to check again what their user may see.
+    """
+    publish_event(workspace_id, ACCESS_CHANGED, {'members': member_ids})
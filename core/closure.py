@@ -0,0 +1,141 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from core.models import Project, Task, TaskDependency, TaskClosure
+
+
+def upstream_ids(task_id):
+    return list(TaskClosure.objects.filter(downstream_id=task_id).values_list('upstream_id', flat=True))
+
+
+def downstream_ids(task_id):
+    return list(TaskClosure.objects.filter(upstream_id=task_id).values_list('downstream_id', flat=True))
+
+
+def is_upstream(upstream_id, downstream_id):
+    return TaskClosure.objects.filter(upstream_id=upstream_id, downstream_id=downstream_id).exists()
+
+
+def _lock_project(task_id):
+    # Dependency writes of a project are serialised on the project row, like TaskDependencyListCreate does
+    project_id = Task.objects.filter(pk=task_id).values_list('project_id', flat=True).first()
+    Project.objects.select_for_update().filter(pk=project_id).first()
+    return project_id
+
+
+def _pairs_through(task_id, dependency_id):
+    # Every chain through the edge joins a chain ending at the dependency with a chain starting at the task
+    return set(upstream_ids(dependency_id)) | {dependency_id}, set(downstream_ids(task_id)) | {task_id}
+
+
+def _reachable(dependents, start):
+    seen, stack = set(), [start]
+    while stack:
+        for dependent in dependents[stack.pop()]:
+            if dependent not in seen:
+                seen.add(dependent)
+                stack.append(dependent)
+    return seen
+
+
+def add_dependency_edge(task_id, dependency_id):
+    with transaction.atomic():
+        _lock_project(task_id)
+        above, below = _pairs_through(task_id, dependency_id)
+        TaskClosure.objects.bulk_create([
+            TaskClosure(upstream_id=upstream_id, downstream_id=downstream_id)
+            for upstream_id in above for downstream_id in below
+        ], ignore_conflicts=True)
+
+
+def prepare_edge_removal(task_id, dependency_id):
+    """
+    Runs before a dependency is deleted: locks its project and returns the arguments of remove_dependency_edge(),
+    the closure pairs that may rely on the edge.
+    """
+    _lock_project(task_id)
+    return _pairs_through(task_id, dependency_id)
+
+
+def prepare_task_removal(task_ids):
+    """
+    Bulk counterpart of prepare_edge_removal() for deleting tasks along with all their dependencies, with one query.
+    The caller holds the project lock.
+    """
+    above, below = set(), set()
+    pairs = TaskClosure.objects.filter(Q(upstream_id__in=task_ids) | Q(downstream_id__in=task_ids))
+    for upstream_id, downstream_id in pairs.values_list('upstream_id', 'downstream_id'):
+        if downstream_id in task_ids:
+            above.add(upstream_id)
+        if upstream_id in task_ids:
+            below.add(downstream_id)
+    return above - task_ids, below - task_ids
+
+
+def remove_dependency_edge(above, below):
+    """
+    Runs once the dependency is gone: drops the pairs of above x below that no remaining chain connects.
+    Such a chain only crosses tasks that the closure still places below `above` and above `below`, so only the
+    dependencies among them are read, not the whole project.
+    """
+    reached = TaskClosure.objects.filter(upstream_id__in=above).values('downstream_id')
+    reaching = TaskClosure.objects.filter(downstream_id__in=below).values('upstream_id')
+    edges = TaskDependency.objects.filter(Q(dependency_id__in=above) | Q(dependency_id__in=reached),
+                                          Q(task_id__in=below) | Q(task_id__in=reaching))
+    dependents = defaultdict(list)
+    for task_id, dependency_id in edges.values_list('task_id', 'dependency_id'):
+        dependents[dependency_id].append(task_id)
+
+    lost = Q()
+    for upstream_id in above:
+        unreachable = below - _reachable(dependents, upstream_id)
+        if unreachable:
+            lost |= Q(upstream_id=upstream_id, downstream_id__in=unreachable)
+    if lost:
+        TaskClosure.objects.filter(lost).delete()
+
+
+def compute_closure(edges):
+    """
+    {(upstream, downstream)} pairs of a dependency graph given as (task, dependency) pairs.
+    Tasks caught in a cycle are left out.
+    """
+    dependents = defaultdict(list)
+    pending = Counter()
+    nodes = set()
+    for task_id, dependency_id in edges:
+        dependents[dependency_id].append(task_id)
+        pending[task_id] += 1
+        nodes.update((task_id, dependency_id))
+
+    order = [node for node in nodes if not pending[node]]
+    for node in order:
+        for dependent in dependents[node]:
+            pending[dependent] -= 1
+            if not pending[dependent]:
+                order.append(dependent)
+
+    reach = {}
+    for node in reversed(order):
+        reach[node] = set()
+        for dependent in dependents[node]:
+            reach[node].add(dependent)
+            reach[node].update(reach.get(dependent, ()))
+    return {(upstream, downstream) for upstream, downstream_ids in reach.items() for downstream in downstream_ids}
+
+
+def rebuild_closure(project_id):
+    """
+    Recomputes the closure rows of a project from its dependencies. Returns the number of rows.
+    """
+    edges = TaskDependency.objects.filter(task__project_id=project_id).values_list('task_id', 'dependency_id')
+    closure = compute_closure(list(edges))
+    with transaction.atomic():
+        TaskClosure.objects.filter(downstream__in=Task.objects.filter(project_id=project_id)).delete()
+        TaskClosure.objects.bulk_create([
+            TaskClosure(upstream_id=upstream_id, downstream_id=downstream_id)
+            for upstream_id, downstream_id in closure
+        ], batch_size=1000)
+    return len(closure)
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.models import TeamMember
+
+# Bumped whenever the layout of the cached blob changes
+DIRECTORY_FORMAT = 1
+DIRECTORY_USER_FIELDS = {'user_name', 'first_name', 'last_name'}
+
+
+def directory_version_key(workspace_id):
+    return f'prism:directory:version:{workspace_id}'
+
+
+def directory_cache_key(workspace_id, version):
+    return f'prism:directory:{DIRECTORY_FORMAT}:{workspace_id}:{version}'
+
+
+def directory_version(workspace_id):
+    key = directory_version_key(workspace_id)
+    version = cache.get(key)
+    if version is None:
+        # Starts from the clock, so that a counter lost to eviction never comes back to a version still cached
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def build_directory(workspace_id):
+    rows = (TeamMember.objects.filter(workspace_id=workspace_id).order_by('member__user_name')
+            .values_list('member_id', 'member__user_name', 'member__first_name', 'member__last_name', 'role'))
+    members = [{'id': member_id, 'user_name': user_name, 'name': f'{first_name} {last_name}', 'role': role}
+               for member_id, user_name, first_name, last_name, role in rows]
+    body = json.dumps(members, separators=(',', ':')).encode()
+    return {'version': hashlib.sha1(body).hexdigest(), 'body': body}
+
+
+def workspace_directory(workspace_id):
+    """
+    Members of a workspace as a ready to send JSON blob, with its version. Blobs are cached under the version of the
+    workspace, a change moves readers to a new key, so a blob built from data read before the change is never served
+    after it.
+    """
+    key = directory_cache_key(workspace_id, directory_version(workspace_id))
+    directory = cache.get(key)
+    if directory is None:
+        directory = build_directory(workspace_id)
+        cache.set(key, directory, settings.DIRECTORY_CACHE_TIMEOUT)
+    return directory
+
+
+def _bump_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # No counter yet, the next reader starts one
+            pass
+
+
+def invalidate_directories(workspace_ids):
+    keys = [directory_version_key(workspace_id) for workspace_id in workspace_ids]
+    # Readers may rebuild until the change commits, so the versions move after it
+    transaction.on_commit(lambda: _bump_versions(keys))
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed, TokenError
+
+from core.broker import ACCESS_CHANGED, get_broker, workspace_channel
+from core.models import TeamMember
+from core.permissions import visible_projects
+
+EVENTS_PATH = re.compile(r'^/api/workspace/(?P<workspace_id>\d+)/events/$')
+
+
+def _authenticate(headers, query):
+    authentication = JWTAuthentication()
+    try:
+        token = query.get('token', [None])[0]
+        if token is None:
+            # The header is parsed like DRF does, so the configured AUTH_HEADER_TYPES apply here too
+            meta = {f'HTTP_{name.decode("latin1").upper().replace("-", "_")}': value.decode('latin1')
+                    for name, value in headers.items()}
+            header = authentication.get_header(SimpleNamespace(META=meta))
+            token = None if header is None else authentication.get_raw_token(header)
+        if token is None:
+            return None
+        return authentication.get_user(authentication.get_validated_token(token))
+    except (InvalidToken, AuthenticationFailed, TokenError):
+        return None
+
+
+def _is_workspace_member(user, workspace_id):
+    return TeamMember.objects.filter(member=user, workspace_id=workspace_id).exists()
+
+
+def _can_see_project(user, project_id):
+    return visible_projects(user).filter(pk=project_id).exists()
+
+
+def _sync(function):
+    def call(*args):
+        close_old_connections()
+        try:
+            return function(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(call)
+
+
+def format_event(event_id, event):
+    data = json.dumps(event['data'], cls=JSONEncoder)
+    return f'id: {event_id}\nevent: {event["type"]}\ndata: {data}\n\n'.encode()
+
+
+async def _send_json_error(send, status, message):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+async def workspace_events(scope, receive, send, workspace_id):
+    """
+    Server-sent events stream of a workspace: `update` events for new Update rows, `task` events for task changes
+    and `tasks` events for batches. Browsers cannot set headers on an EventSource, so the access token may be
+    passed as `?token=`. The stream ends when its user leaves the workspace.
+    """
+    headers = dict(scope['headers'])
+    query = parse_qs(scope.get('query_string', b'').decode())
+    user = await _sync(_authenticate)(headers, query)
+    if user is None:
+        return await _send_json_error(send, 401, 'Authentication credentials were not provided')
+    if not await _sync(_is_workspace_member)(user, workspace_id):
+        return await _send_json_error(send, 403, 'Access restricted to workspace members only')
+
+    subscription = get_broker().subscribe(workspace_channel(workspace_id))
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        subscription.close()
+
+    disconnect = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+        event_id = 0
+        visible_projects = {}
+        while True:
+            try:
+                event = await subscription.get(timeout=settings.EVENT_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+            if event is None:
+                break
+            if event['type'] == ACCESS_CHANGED:
+                members = event['data']['members']
+                if members is None or user.id in members:
+                    # Members who left the workspace lose the stream, project visibility is looked up again
+                    if not await _sync(_is_workspace_member)(user, workspace_id):
+                        break
+                    visible_projects.clear()
+                continue
+            project_id = event['data'].get('project')
+            if project_id is not None:
+                if project_id not in visible_projects:
+                    visible_projects[project_id] = await _sync(_can_see_project)(user, project_id)
+                if not visible_projects[project_id]:
+                    continue
+            event_id += 1
+            await send({'type': 'http.response.body', 'body': format_event(event_id, event), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        subscription.close()
+        disconnect.cancel()
+
+
+class EventStreamRouter:
+    """
+    Serves the event streams directly on the ASGI app and hands every other request to Django.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = EVENTS_PATH.match(scope['path'])
+            if match is not None:
+                return await workspace_events(scope, receive, send, int(match.group('workspace_id')))
+        return await self.application(scope, receive, send)
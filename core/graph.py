@@ -0,0 +1,152 @@
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import Task, TaskDependency
+
+
+class DependencyCycle(Exception):
+    def __init__(self, tasks):
+        super().__init__('Dependency cycle between tasks')
+        self.tasks = tasks
+
+
+def graph_cache_key(project_id, version):
+    return f'prism:graph:{project_id}:{version}'
+
+
+class DependencyGraph:
+    """
+    Dependency DAG of one project. An edge runs from a dependency to the task waiting for it.
+    Durations are counted in days; completed tasks have no remaining duration.
+    """
+
+    def __init__(self, tasks, edges):
+        self.tasks = tasks
+        self.dependencies = {task_id: [] for task_id in tasks}
+        self.dependents = {task_id: [] for task_id in tasks}
+        for task_id, dependency_id in edges:
+            if task_id in tasks and dependency_id in tasks:
+                self.dependencies[task_id].append(dependency_id)
+                self.dependents[dependency_id].append(task_id)
+
+    @classmethod
+    def build(cls, project_id):
+        tasks = {
+            task['id']: task for task in
+            Task.objects.filter(project_id=project_id).values('id', 'name', 'column', 'duration', 'deadline')
+        }
+        edges = TaskDependency.objects.filter(task__project_id=project_id).values_list('task_id', 'dependency_id')
+        return cls(tasks, list(edges))
+
+    @classmethod
+    def load(cls, project):
+        """
+        Graph of the project at its current version. Every task or dependency write bumps the version,
+        so cached graphs are never reused after a change.
+        """
+        key = graph_cache_key(project.id, project.version)
+        graph = cache.get(key)
+        if graph is None:
+            graph = cls.build(project.id)
+            cache.set(key, graph, settings.GRAPH_CACHE_TIMEOUT)
+        return graph
+
+    def depends_on(self, task_id, dependency_id):
+        """
+        Path of task ids from `task_id` down to `dependency_id` through the dependencies, None without one.
+        """
+        parents = {task_id: None}
+        stack = [task_id]
+        while stack:
+            current = stack.pop()
+            if current == dependency_id:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = parents[current]
+                return path[::-1]
+            for parent in self.dependencies.get(current, ()):
+                if parent not in parents:
+                    parents[parent] = current
+                    stack.append(parent)
+        return None
+
+    def topological_order(self):
+        pending = {task_id: len(dependencies) for task_id, dependencies in self.dependencies.items()}
+        ready = [task_id for task_id, count in pending.items() if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            task_id = heapq.heappop(ready)
+            order.append(task_id)
+            for dependent in self.dependents[task_id]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    heapq.heappush(ready, dependent)
+        if len(order) < len(self.tasks):
+            raise DependencyCycle(sorted(task_id for task_id, count in pending.items() if count > 0))
+        return order
+
+    def remaining_duration(self, task_id):
+        task = self.tasks[task_id]
+        return 0 if task['column'] == 'complete' else task['duration']
+
+    def schedule(self, start):
+        """
+        Earliest/latest start and finish of every task (in days from `start`), their slack and one critical path.
+        """
+        order = self.topological_order()
+        earliest_start, earliest_finish = {}, {}
+        for task_id in order:
+            earliest_start[task_id] = max((earliest_finish[d] for d in self.dependencies[task_id]), default=0)
+            earliest_finish[task_id] = earliest_start[task_id] + self.remaining_duration(task_id)
+        length = max(earliest_finish.values(), default=0)
+
+        latest_start, latest_finish = {}, {}
+        for task_id in reversed(order):
+            latest_finish[task_id] = min((latest_start[d] for d in self.dependents[task_id]), default=length)
+            latest_start[task_id] = latest_finish[task_id] - self.remaining_duration(task_id)
+
+        critical_path = []
+        ends = [task_id for task_id in order if earliest_finish[task_id] == length]
+        current = ends[-1] if length else None
+        while current is not None:
+            critical_path.append(current)
+            if earliest_start[current] == 0:
+                break
+            current = next(d for d in self.dependencies[current]
+                           if earliest_finish[d] == earliest_start[current] and latest_start[d] == earliest_start[d])
+        critical_path.reverse()
+
+        tasks = []
+        for task_id in order:
+            task = self.tasks[task_id]
+            finish_date = start + timedelta(days=earliest_finish[task_id])
+            tasks.append({
+                'id': task_id,
+                'name': task['name'],
+                'duration': self.remaining_duration(task_id),
+                'dependencies': self.dependencies[task_id],
+                'earliest_start': earliest_start[task_id],
+                'earliest_finish': earliest_finish[task_id],
+                'latest_start': latest_start[task_id],
+                'latest_finish': latest_finish[task_id],
+                'slack': latest_start[task_id] - earliest_start[task_id],
+                'critical': latest_start[task_id] == earliest_start[task_id],
+                'start_date': start + timedelta(days=earliest_start[task_id]),
+                'finish_date': finish_date,
+                'deadline': task['deadline'],
+                'late': task['deadline'] is not None and finish_date > task['deadline'],
+            })
+
+        return {
+            'start': start,
+            'duration': length,
+            'finish': start + timedelta(days=length),
+            'order': order,
+            'critical_path': critical_path,
+            'tasks': tasks,
+        }
@@ -0,0 +1,132 @@
+import hashlib
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler, SkipFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core.models import WorkspaceImage, file_digest
+from core.storage import content_storage
+
+IMAGE_VARIANTS = {
+    'thumbnail': {'size': (320, 320), 'format': 'JPEG', 'crop': False},
+    'avatar': {'size': (128, 128), 'format': 'WEBP', 'crop': True},
+    'webp': {'size': (1600, 1600), 'format': 'WEBP', 'crop': False},
+}
+VARIANT_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams an upload to a temporary file chunk by chunk, hashing it on the way, and drops files larger than
+    IMAGE_MAX_UPLOAD_SIZE as soon as they cross the limit. Completed files carry their `sha256`.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_MAX_UPLOAD_SIZE:
+            self.too_large = True
+            self.file.close()
+            raise SkipFile
+        self.digest.update(raw_data)
+        super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.digest.hexdigest()
+        return file
+
+
+def variant_name(digest, name, spec):
+    width, height = spec['size']
+    return f'workspaces/{digest[:2]}/{digest}-{name}-{width}x{height}.{VARIANT_EXTENSIONS[spec["format"]]}'
+
+
+def render_variant(image, spec):
+    if spec['crop']:
+        image = ImageOps.fit(image, spec['size'], Image.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail(spec['size'], Image.LANCZOS)
+
+    if spec['format'] == 'JPEG':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # JPEG has no transparency, flatten it onto white
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    buffer = BytesIO()
+    image.save(buffer, spec['format'], quality=82, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def process_image(workspace_image):
+    """
+    Writes the resized variants of an image. Returns {variant: storage name}.
+    """
+    with workspace_image.image.open('rb') as file:
+        # Images uploaded before content addressing have no digest yet
+        digest = workspace_image.digest or file_digest(file)
+        file.seek(0)
+        source = Image.open(file)
+        # The size comes from the header, larger images are refused before their pixels are decoded
+        if source.width * source.height > settings.IMAGE_MAX_PIXELS:
+            raise ValueError(f'{source.width}x{source.height} pixels is over IMAGE_MAX_PIXELS')
+        source.load()
+    source = ImageOps.exif_transpose(source)
+
+    variants = {}
+    for name, spec in IMAGE_VARIANTS.items():
+        path = variant_name(digest, name, spec)
+        if not content_storage.exists(path):
+            content_storage.save(path, render_variant(source, spec))
+        variants[name] = path
+    return variants
+
+
+def claim_pending_images(batch_size):
+    """
+    Leases a batch of unprocessed images to the calling worker, so that concurrent workers never process the same
+    image at once. Leases of crashed workers run out after IMAGE_LEASE_SECONDS.
+    """
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.IMAGE_LEASE_SECONDS)
+    with transaction.atomic():
+        due = WorkspaceImage.objects.select_for_update(skip_locked=True) \
+            .filter(Q(claimed__isnull=True) | Q(claimed__lt=expired), status='pending').order_by('id')[:batch_size]
+        images = list(due)
+        WorkspaceImage.objects.filter(id__in=[image.id for image in images]).update(claimed=now)
+    return images
+
+
+def process_pending_images(batch_size=20):
+    """
+    Processes one batch of uploaded images. Returns the number of images handled.
+    """
+    images = claim_pending_images(batch_size)
+    for image in images:
+        try:
+            variants, status = process_image(image), 'ready'
+        except Exception:
+            # Whatever a broken or hostile file makes Pillow raise, it must not stop the rest of the batch
+            variants, status = {}, 'failed'
+        WorkspaceImage.objects.filter(pk=image.pk).update(variants=variants, status=status)
+    return len(images)
@@ -0,0 +1,61 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from core.models import Workspace, TeamMember, Project, ProjectMember
+from core.permissions import visible_projects
+from user.models import PrismUser
+
+
+class Command(BaseCommand):
+    help = 'Times the project visibility query on a generated workspace. The data is rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--projects', type=int, default=2000)
+        parser.add_argument('--members', type=int, default=500)
+        parser.add_argument('--project-members', type=int, default=50, help='Members of every project')
+        parser.add_argument('--private', type=float, default=0.3, help='Share of private projects')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.populate(options)
+            old = Project.objects.filter(workspace=self.workspace).filter(
+                Q(is_private=False) | Q(projectmember__member_id=user.id))
+            new = visible_projects(user, self.workspace.id)
+
+            for label, queryset in (('join', old), ('exists', new)):
+                ids = list(queryset.values_list('id', flat=True))
+                elapsed = self.time(queryset, options['repeat'])
+                self.stdout.write(f'{label:>6}: {len(ids)} row(s), {len(set(ids))} project(s), {elapsed:.2f} ms')
+            transaction.set_rollback(True)
+
+    def populate(self, options):
+        rng = random.Random(0)
+        PrismUser.objects.bulk_create([
+            PrismUser(email=f'benchmark{number}@prism.test', user_name=f'benchmark{number}', first_name='Bench',
+                      last_name=str(number))
+            for number in range(options['members'])
+        ])
+        users = list(PrismUser.objects.filter(user_name__startswith='benchmark').order_by('id'))
+        self.workspace = Workspace.objects.create(name='Benchmark', owner=users[0])
+        TeamMember.objects.bulk_create([TeamMember(workspace=self.workspace, member=user) for user in users])
+        Project.objects.bulk_create([
+            Project(workspace=self.workspace, name=f'Project {number}', is_private=rng.random() < options['private'])
+            for number in range(options['projects'])
+        ])
+        members = []
+        for project_id in Project.objects.filter(workspace=self.workspace).values_list('id', flat=True):
+            sample = rng.sample(users, min(options['project_members'], len(users)))
+            members += [ProjectMember(project_id=project_id, member=user) for user in sample]
+        ProjectMember.objects.bulk_create(members, batch_size=5000)
+        return users[0]
+
+    def time(self, queryset, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.values_list('id', flat=True))
+        return (time.perf_counter() - start) * 1000 / repeat
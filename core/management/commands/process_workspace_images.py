@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.images import process_pending_images
+
+
+class Command(BaseCommand):
+    help = 'Makes the resized variants (thumbnail, avatar, WebP) of uploaded workspace images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new images instead of exiting')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep when there is nothing to do')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_images(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} image(s)')
+            if not options['loop']:
+                break
+            if processed < options['batch_size']:
+                time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Task, Project
+from core.ordering import rebalance_column
+
+
+class Command(BaseCommand):
+    help = 'Re-spreads task ordering keys in columns where neighbouring tasks have run out of room'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-gap', type=int, default=8,
+                            help='Rebalance a column when two neighbouring tasks are closer than this')
+        parser.add_argument('--project', type=int, help='Only rebalance this project')
+
+    def handle(self, *args, **options):
+        tasks = Task.objects.order_by('project_id', 'column', 'index', 'id')
+        if options['project']:
+            tasks = tasks.filter(project_id=options['project'])
+
+        crowded = set()
+        previous = None
+        for project_id, column, index in tasks.values_list('project_id', 'column', 'index').iterator():
+            if index is None or (previous is not None and previous[:2] == (project_id, column)
+                                 and index - previous[2] < options['min_gap']):
+                crowded.add((project_id, column))
+            previous = (project_id, column, index or 0)
+
+        for project_id, column in sorted(crowded):
+            with transaction.atomic():
+                Project.objects.select_for_update().filter(pk=project_id).first()
+                renumbered = rebalance_column(project_id, column)
+            self.stdout.write(f'Project {project_id} {column}: renumbered {renumbered} task(s)')
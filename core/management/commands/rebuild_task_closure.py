@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.closure import rebuild_closure
+from core.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the transitive task dependency index from the dependencies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, help='Only rebuild this project')
+
+    def handle(self, *args, **options):
+        projects = Project.objects.order_by('id').values_list('id', flat=True)
+        if options['project']:
+            projects = projects.filter(id=options['project'])
+
+        for project_id in list(projects):
+            with transaction.atomic():
+                Project.objects.select_for_update().filter(pk=project_id).first()
+                rows = rebuild_closure(project_id)
+            self.stdout.write(f'Project {project_id}: {rows} dependent task pair(s)')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.utils import deliver_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued outgoing emails in batches over a reused SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = deliver_queued_emails(options['batch_size'], options['max_attempts'])
+            if sent:
+                self.stdout.write(f'Sent {sent} email(s)')
+            if not options['loop']:
+                break
+            if sent < options['batch_size']:
+                time.sleep(options['interval'])
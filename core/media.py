@@ -0,0 +1,115 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, FileResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Files named after the sha256 of their content (see core.models.upload_to and core.images.variant_name)
+CONTENT_ADDRESSED = re.compile(r'^workspaces/[0-9a-f]{2}/[0-9a-f]{64}(?:-[\w-]+)?(?:\.\w+)?$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RANGE = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single byte range, None when the header should be ignored and the whole file served, or
+    False when the range cannot be satisfied.
+    """
+    match = RANGE.match(header.strip())
+    if match is None or not (match['start'] or match['end']):
+        return None
+    if not match['start']:
+        suffix = int(match['end'])
+        return (max(size - suffix, 0), size - 1) if suffix and size else False
+    start = int(match['start'])
+    end = min(int(match['end']), size - 1) if match['end'] else size - 1
+    if start >= size:
+        return False
+    return (start, end) if end >= start else None
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _file_response(request, path, full_path, size, etag, last_modified):
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    if settings.MEDIA_SERVER == 'x-accel-redirect':
+        # nginx sends the file itself, Range requests included
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        return response
+    if settings.MEDIA_SERVER == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return response
+
+    byte_range = None
+    if 'HTTP_RANGE' in request.META:
+        if_range = request.META.get('HTTP_IF_RANGE')
+        # If-Range needs a strong validator, a weak ETag never matches it
+        if if_range is None or (if_range == etag and not etag.startswith('W/')) \
+                or parse_http_date_safe(if_range) == last_modified:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is not None:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(full_path, start, end - start + 1), status=206,
+                                         content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        # WSGI servers with a file wrapper (gunicorn, uWSGI) send the file with sendfile()
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serves uploaded files. Content addressed workspace images never change, so they are cached for a year and their
+    digest is their ETag; other files are revalidated. MEDIA_SERVER hands the transfer to nginx (x-accel-redirect)
+    or Apache (x-sendfile) instead of Python.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    stat = os.stat(full_path)
+
+    content_addressed = CONTENT_ADDRESSED.match(path)
+    if content_addressed:
+        # The name holds the digest, and for variants what was derived from it
+        etag = f'"{os.path.basename(path)}"'
+    else:
+        etag = f'W/"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, path, full_path, stat.st_size, etag, last_modified)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if content_addressed else 'public, no-cache'
+    return response
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.5 on 2026-10-18 07:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_auto_20210725_0431'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='modified',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='version',
+            field=models.PositiveIntegerField(blank=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='workspace',
+            name='modified',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='workspace',
+            name='version',
+            field=models.PositiveIntegerField(blank=True, default=0),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+TASK_INDEX_GAP = 1024
+
+
+def spread_task_indexes(apps, schema_editor):
+    # The old keys collide and may be missing, so every column is numbered afresh in its current order
+    Task = apps.get_model('core', 'Task')
+    tasks = Task.objects.order_by('project_id', 'column', F('index').asc(nulls_last=True), 'id') \
+        .values_list('id', 'project_id', 'column', 'index')
+    changed, column, position = [], None, 0
+    for task_id, project_id, task_column, index in tasks.iterator():
+        if (project_id, task_column) != column:
+            column, position = (project_id, task_column), 0
+        position += 1
+        if index != position * TASK_INDEX_GAP:
+            changed.append(Task(id=task_id, index=position * TASK_INDEX_GAP))
+    Task.objects.bulk_update(changed, ['index'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='index',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(spread_task_indexes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_task_sparse_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='update',
+            index=models.Index(fields=['workspace', 'created', 'id'], name='core_update_feed_idx'),
+        ),
+    ]
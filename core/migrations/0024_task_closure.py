@@ -0,0 +1,69 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:08
+
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def compute_closure(edges):
+    # Frozen copy of core.closure.compute_closure
+    dependents = defaultdict(list)
+    pending = Counter()
+    nodes = set()
+    for task_id, dependency_id in edges:
+        dependents[dependency_id].append(task_id)
+        pending[task_id] += 1
+        nodes.update((task_id, dependency_id))
+
+    order = [node for node in nodes if not pending[node]]
+    for node in order:
+        for dependent in dependents[node]:
+            pending[dependent] -= 1
+            if not pending[dependent]:
+                order.append(dependent)
+
+    reach = {}
+    for node in reversed(order):
+        reach[node] = set()
+        for dependent in dependents[node]:
+            reach[node].add(dependent)
+            reach[node].update(reach.get(dependent, ()))
+    return {(upstream, downstream) for upstream, downstream_ids in reach.items() for downstream in downstream_ids}
+
+
+def build_task_closure(apps, schema_editor):
+    TaskDependency = apps.get_model('core', 'TaskDependency')
+    TaskClosure = apps.get_model('core', 'TaskClosure')
+    closure = compute_closure(list(TaskDependency.objects.values_list('task_id', 'dependency_id')))
+    TaskClosure.objects.bulk_create([
+        TaskClosure(upstream_id=upstream_id, downstream_id=downstream_id)
+        for upstream_id, downstream_id in closure
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_update_feed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('downstream', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upstream_closure', to='core.task')),
+                ('upstream', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='downstream_closure', to='core.task')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='taskclosure',
+            index=models.Index(fields=['downstream', 'upstream'], name='core_closure_downstream_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskclosure',
+            constraint=models.UniqueConstraint(fields=('upstream', 'downstream'), name='core_closure_unique'),
+        ),
+        migrations.RunPython(build_task_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Count, Value
+from django.db.models.functions import Coalesce
+
+
+def count_subtasks(apps, schema_editor):
+    Task = apps.get_model('core', 'Task')
+    SubTask = apps.get_model('core', 'SubTask')
+    subtasks = SubTask.objects.filter(task=OuterRef('pk')).order_by().values('task')
+    Task.objects.update(
+        subtasks_total=Coalesce(Subquery(subtasks.annotate(count=Count('id')).values('count')), Value(0)),
+        subtasks_done=Coalesce(Subquery(subtasks.filter(status=True).annotate(count=Count('id')).values('count')),
+                               Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_task_closure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='subtasks_done',
+            field=models.PositiveIntegerField(blank=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='subtasks_total',
+            field=models.PositiveIntegerField(blank=True, default=0),
+        ),
+        migrations.RunPython(count_subtasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+
+
+def build_task_stats(apps, schema_editor):
+    Task = apps.get_model('core', 'Task')
+    TaskMember = apps.get_model('core', 'TaskMember')
+    TaskStat = apps.get_model('core', 'TaskStat')
+    AssigneeStat = apps.get_model('core', 'AssigneeStat')
+    tasks = (Task.objects.order_by().values('project_id', 'column', 'priority', due=TruncDate('deadline'))
+             .annotate(tasks=Count('id')))
+    TaskStat.objects.bulk_create([TaskStat(**row) for row in tasks], batch_size=1000)
+    members = (TaskMember.objects.order_by().values('member_id', project_id=F('task__project_id'),
+                                                     column=F('task__column')).annotate(tasks=Count('id')))
+    AssigneeStat.objects.bulk_create([AssigneeStat(**row) for row in members], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0025_task_subtask_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('column', models.CharField(choices=[('todo', 'To Do'), ('doing', 'Doing'), ('complete', 'Complete')], max_length=15)),
+                ('priority', models.CharField(choices=[('high', 'High'), ('mid', 'Mid'), ('low', 'Low')], max_length=15)),
+                ('due', models.DateField(blank=True, null=True)),
+                ('tasks', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AssigneeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('column', models.CharField(choices=[('todo', 'To Do'), ('doing', 'Doing'), ('complete', 'Complete')], max_length=15)),
+                ('tasks', models.IntegerField(default=0)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.project')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='taskstat',
+            constraint=models.UniqueConstraint(condition=models.Q(('due__isnull', False)), fields=('project', 'column', 'priority', 'due'), name='core_taskstat_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskstat',
+            constraint=models.UniqueConstraint(condition=models.Q(('due__isnull', True)), fields=('project', 'column', 'priority'), name='core_taskstat_undated_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='assigneestat',
+            constraint=models.UniqueConstraint(fields=('project', 'member', 'column'), name='core_assigneestat_unique'),
+        ),
+        migrations.RunPython(build_task_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:14
+
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Min, F
+
+UNIQUE_FIELDS = {
+    'TeamMember': ('workspace_id', 'member_id'),
+    'MeetingParticipant': ('meeting_id', 'participant_id'),
+    'ProjectMember': ('project_id', 'member_id'),
+    'TaskMember': ('task_id', 'member_id'),
+    'TaskDependency': ('task_id', 'dependency_id'),
+}
+
+
+def compute_closure(edges):
+    # Frozen copy of core.closure.compute_closure
+    dependents = defaultdict(list)
+    pending = Counter()
+    nodes = set()
+    for task_id, dependency_id in edges:
+        dependents[dependency_id].append(task_id)
+        pending[task_id] += 1
+        nodes.update((task_id, dependency_id))
+
+    order = [node for node in nodes if not pending[node]]
+    for node in order:
+        for dependent in dependents[node]:
+            pending[dependent] -= 1
+            if not pending[dependent]:
+                order.append(dependent)
+
+    reach = {}
+    for node in reversed(order):
+        reach[node] = set()
+        for dependent in dependents[node]:
+            reach[node].add(dependent)
+            reach[node].update(reach.get(dependent, ()))
+    return {(upstream, downstream) for upstream, downstream_ids in reach.items() for downstream in downstream_ids}
+
+
+def remove_duplicates(apps, schema_editor):
+    removed = {}
+    for model_name, fields in UNIQUE_FIELDS.items():
+        model = apps.get_model('core', model_name)
+        duplicates = (model.objects.order_by().values(*fields).annotate(keep=Min('id'), rows=Count('id'))
+                      .filter(rows__gt=1))
+        removed[model_name] = 0
+        for duplicate in duplicates:
+            rows = model.objects.filter(**{field: duplicate[field] for field in fields})
+            if model_name == 'TeamMember' and rows.filter(role='admin').exists():
+                rows.filter(id=duplicate['keep']).update(role='admin')
+            removed[model_name] += rows.exclude(id=duplicate['keep']).delete()[0]
+
+    # Duplicates were counted in the derived tables, recount them
+    if removed['TaskDependency']:
+        TaskDependency = apps.get_model('core', 'TaskDependency')
+        TaskClosure = apps.get_model('core', 'TaskClosure')
+        closure = compute_closure(list(TaskDependency.objects.values_list('task_id', 'dependency_id')))
+        TaskClosure.objects.all().delete()
+        TaskClosure.objects.bulk_create([
+            TaskClosure(upstream_id=upstream_id, downstream_id=downstream_id)
+            for upstream_id, downstream_id in closure
+        ], batch_size=1000)
+    if removed['TaskMember']:
+        TaskMember = apps.get_model('core', 'TaskMember')
+        AssigneeStat = apps.get_model('core', 'AssigneeStat')
+        members = (TaskMember.objects.order_by().values('member_id', project_id=F('task__project_id'),
+                                                         column=F('task__column')).annotate(tasks=Count('id')))
+        AssigneeStat.objects.all().delete()
+        AssigneeStat.objects.bulk_create([AssigneeStat(**row) for row in members], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_task_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'column', 'index'], name='core_task_board_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teammember',
+            index=models.Index(fields=['member', 'workspace', 'role'], name='core_teammember_role_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='meetingparticipant',
+            constraint=models.UniqueConstraint(fields=('meeting', 'participant'), name='core_participant_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='projectmember',
+            constraint=models.UniqueConstraint(fields=('project', 'member'), name='core_projectmember_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskdependency',
+            constraint=models.UniqueConstraint(fields=('task', 'dependency'), name='core_dependency_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskmember',
+            constraint=models.UniqueConstraint(fields=('task', 'member'), name='core_taskmember_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='teammember',
+            constraint=models.UniqueConstraint(fields=('workspace', 'member'), name='core_teammember_unique'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:27
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_unique_memberships_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspaceimage',
+            name='claimed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workspaceimage',
+            name='digest',
+            field=models.CharField(blank=True, default=None, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='workspaceimage',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=15),
+        ),
+        migrations.AddField(
+            model_name='workspaceimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='workspaceimage',
+            name='image',
+            field=models.ImageField(blank=True, default=None, null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.upload_to),
+        ),
+        migrations.AddIndex(
+            model_name='workspaceimage',
+            index=models.Index(fields=['status', 'claimed'], name='core_image_pending_idx'),
+        ),
+    ]
@@ -1,13 +1,29 @@
-from datetime import datetime
+import hashlib
+import os
+import re
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
+from core.storage import content_storage
 from user.models import PrismUser
 
 
+def file_digest(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
 def upload_to(instance, filename):
-    time = str(int(datetime.now().timestamp()))
-    return f'workspaces/{time}_{filename}'
+    # Named after the content, so identical images share one file that never changes
+    if not instance.digest:
+        instance.digest = file_digest(instance.image)
+    extension = os.path.splitext(filename)[1].lower()
+    if not re.fullmatch(r'\.[a-z0-9]{1,5}', extension):
+        extension = ''
+    return f'workspaces/{instance.digest[:2]}/{instance.digest}{extension}'
 
 
 class Workspace(models.Model):
@@ -22,13 +38,30 @@ class Workspace(models.Model):
     owner = models.ForeignKey(PrismUser, on_delete=models.CASCADE, blank=True)
     type = models.CharField(max_length=31, choices=WORKSPACE_TYPES, default="it_company")
     image = models.CharField(max_length=255, blank=True, null=True, default=None)
+    version = models.PositiveIntegerField(default=0, blank=True)
+    modified = models.DateTimeField(default=timezone.now, blank=True)
 
     def __str__(self):
         return self.name
 
 
 class WorkspaceImage(models.Model):
-    image = models.ImageField(upload_to=upload_to, blank=True, null=True, default=None)
+    IMAGE_STATUSES = (
+        ("pending", "Pending"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    )
+
+    image = models.ImageField(upload_to=upload_to, storage=content_storage, blank=True, null=True, default=None)
+    digest = models.CharField(max_length=64, unique=True, blank=True, null=True, default=None)
+    status = models.CharField(max_length=15, choices=IMAGE_STATUSES, default="pending")
+    variants = models.JSONField(default=dict, blank=True)
+    claimed = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'claimed'], name='core_image_pending_idx'),
+        ]
 
     def __str__(self):
         return "Workspace Image"
@@ -39,6 +72,11 @@ class Update(models.Model):
     message = models.CharField(max_length=1023)
     created = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['workspace', 'created', 'id'], name='core_update_feed_idx'),
+        ]
+
     def __str__(self):
         return self.message
 
@@ -52,6 +90,15 @@ class TeamMember(models.Model):
     member = models.ForeignKey(PrismUser, on_delete=models.CASCADE)
     role = models.CharField(max_length=31, choices=TEAMMEMBER_ROLES, default="member")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['workspace', 'member'], name='core_teammember_unique'),
+        ]
+        indexes = [
+            # Covers the role lookup behind every workspace permission check
+            models.Index(fields=['member', 'workspace', 'role'], name='core_teammember_role_idx'),
+        ]
+
     def __str__(self):
         return self.workspace.name + " | " + self.member.user_name
 
@@ -71,6 +118,11 @@ class MeetingParticipant(models.Model):
     meeting = models.ForeignKey(Meeting, on_delete=models.CASCADE)
     participant = models.ForeignKey(PrismUser, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['meeting', 'participant'], name='core_participant_unique'),
+        ]
+
     def __str__(self):
         return self.meeting.agenda + " | " + self.participant.user_name
 
@@ -81,6 +133,8 @@ class Project(models.Model):
     name = models.CharField(max_length=127)
     createad_at = models.DateTimeField(default=timezone.now, blank=True)
     is_archieved = models.BooleanField(default=False, blank=True)
+    version = models.PositiveIntegerField(default=0, blank=True)
+    modified = models.DateTimeField(default=timezone.now, blank=True)
 
     def __str__(self):
         return self.workspace.name + " - " + self.name
@@ -90,6 +144,11 @@ class ProjectMember(models.Model):
     member = models.ForeignKey(PrismUser, on_delete=models.CASCADE)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'member'], name='core_projectmember_unique'),
+        ]
+
     def __str__(self):
         return self.project.name + " | " + self.member.user_name
 
@@ -110,11 +169,26 @@ class Task(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, blank=True, default=None)
     column = models.CharField(max_length=15, choices=COLUMN_OPTIONS, default="todo")
     name = models.CharField(max_length=127)
-    index = models.PositiveSmallIntegerField(blank=True, null=True)
+    index = models.PositiveIntegerField(blank=True, null=True)
     created = models.DateTimeField(default=timezone.now, blank=True, null=True)
     deadline = models.DateTimeField(default=None, blank=True, null=True)
     priority = models.CharField(max_length=15, choices=TASK_PRIORITIES, default="low")
     duration = models.PositiveSmallIntegerField(default=1, blank=True)
+    # Denormalised from SubTask so that boards can show progress without loading subtasks
+    subtasks_total = models.PositiveIntegerField(default=0, blank=True)
+    subtasks_done = models.PositiveIntegerField(default=0, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'column', 'index'], name='core_task_board_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Kept so that writes can tell which summary rows the task leaves
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def __str__(self):
         return self.name
@@ -124,6 +198,11 @@ class TaskMember(models.Model):
     member = models.ForeignKey(PrismUser, on_delete=models.CASCADE)
     task = models.ForeignKey(Task, on_delete=models.CASCADE, blank=True, default=None)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'member'], name='core_taskmember_unique'),
+        ]
+
     def __str__(self):
         return self.task.name + " | " + self.member.user_name
 
@@ -141,5 +220,95 @@ class TaskDependency(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, blank=True, default=None, related_name='dependecy_taksks')
     dependency = models.ForeignKey(Task, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'dependency'], name='core_dependency_unique'),
+        ]
+
     def __str__(self):
         return self.dependency.name + " > " + self.task.name
+
+
+class TaskClosure(models.Model):
+    """
+    Transitive closure of TaskDependency: `downstream` waits, directly or not, for `upstream`.
+    """
+    upstream = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='downstream_closure')
+    downstream = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='upstream_closure')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['upstream', 'downstream'], name='core_closure_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['downstream', 'upstream'], name='core_closure_downstream_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.upstream_id} > {self.downstream_id}'
+
+
+class TaskStat(models.Model):
+    """
+    Number of tasks of a project per column, priority and due date, kept in step with Task writes.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    column = models.CharField(max_length=15, choices=Task.COLUMN_OPTIONS)
+    priority = models.CharField(max_length=15, choices=Task.TASK_PRIORITIES)
+    due = models.DateField(blank=True, null=True)
+    tasks = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'column', 'priority', 'due'], condition=Q(due__isnull=False),
+                                    name='core_taskstat_unique'),
+            models.UniqueConstraint(fields=['project', 'column', 'priority'], condition=Q(due__isnull=True),
+                                    name='core_taskstat_undated_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.project_id} {self.column} {self.priority} {self.due}: {self.tasks}'
+
+
+class AssigneeStat(models.Model):
+    """
+    Number of tasks of a project assigned to a member per column, kept in step with Task and TaskMember writes.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    member = models.ForeignKey(PrismUser, on_delete=models.CASCADE)
+    column = models.CharField(max_length=15, choices=Task.COLUMN_OPTIONS)
+    tasks = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'member', 'column'], name='core_assigneestat_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.project_id} {self.member_id} {self.column}: {self.tasks}'
+
+
+class OutgoingEmail(models.Model):
+    EMAIL_STATUSES = (
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    )
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=15, choices=EMAIL_STATUSES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt'], name='core_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return self.subject
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import F, Max
+
+from core.models import Task, Project
+from core.stats import lock_stat_values
+
+# Tasks are ordered by sparse keys, so that a task can be placed between two siblings by writing only its own row
+TASK_INDEX_GAP = 1024
+TASK_INDEX_MAX = 2147483647
+
+
+def next_index(project_id, column, exclude=None):
+    tasks = Task.objects.filter(project_id=project_id, column=column)
+    if exclude is not None:
+        tasks = tasks.exclude(pk=exclude)
+    last_index = tasks.aggregate(Max('index'))['index__max']
+    return (last_index or 0) + TASK_INDEX_GAP
+
+
+def rebalance_column(project_id, column):
+    """
+    Spreads the tasks of a column evenly, keeping their current order. Tasks without a key go last.
+    Returns the number of tasks renumbered.
+    """
+    tasks = list(Task.objects.filter(project_id=project_id, column=column)
+                 .order_by(F('index').asc(nulls_last=True), 'id'))
+    changed = []
+    for position, task in enumerate(tasks, start=1):
+        if task.index != position * TASK_INDEX_GAP:
+            task.index = position * TASK_INDEX_GAP
+            changed.append(task)
+    Task.objects.bulk_update(changed, ['index'])
+    return len(changed)
+
+
+def _free_index(task, column, before=None, after=None):
+    siblings = Task.objects.filter(project_id=task.project_id, column=column).exclude(pk=task.pk)
+    if after is not None:
+        lower = after.index
+        upper = siblings.filter(index__gt=lower).order_by('index').values_list('index', flat=True).first()
+    elif before is not None:
+        upper = before.index
+        lower = siblings.filter(index__lt=upper).order_by('-index').values_list('index', flat=True).first() or 0
+    else:
+        lower = siblings.aggregate(Max('index'))['index__max'] or 0
+        upper = None
+
+    if upper is None:
+        return lower + TASK_INDEX_GAP if lower + TASK_INDEX_GAP <= TASK_INDEX_MAX else None
+    if upper - lower < 2:
+        return None
+    return (lower + upper) // 2
+
+
+def move_task(task, column, before=None, after=None):
+    """
+    Places `task` in `column`, right before `before` or right after `after` (at the end when neither is given).
+    Moves of one project are serialised by locking the project row, so concurrent moves never pick the same key.
+    """
+    with transaction.atomic():
+        Project.objects.select_for_update().filter(pk=task.project_id).first()
+        lock_stat_values([task])
+        for anchor in (before, after):
+            if anchor is not None:
+                anchor.refresh_from_db(fields=['index', 'column'])
+                column = anchor.column
+
+        anchor = before or after
+        if anchor is not None and anchor.index is None:
+            # Tasks created before sparse keys may have none, give the column keys first
+            rebalance_column(task.project_id, column)
+            anchor.refresh_from_db(fields=['index'])
+
+        index = _free_index(task, column, before, after)
+        if index is None:
+            # No key left between the neighbours, renumber the column once and retry
+            rebalance_column(task.project_id, column)
+            for anchor in (before, after):
+                if anchor is not None:
+                    anchor.refresh_from_db(fields=['index'])
+            index = _free_index(task, column, before, after)
+
+        task.column = column
+        task.index = index
+        task.save(update_fields=['column', 'index'])
+    return task
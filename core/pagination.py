@@ -0,0 +1,117 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(created, pk):
+    return base64.urlsafe_b64encode(f'{created.isoformat()}|{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created, pk = parse_datetime(created), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    return (created, pk) if created is not None else None
+
+
+def seek_after(queryset, created, pk):
+    """
+    Rows that come after (created, pk) in newest first order. The plain `created` bound is implied by the OR, but
+    unlike the OR it can bound the range scan of an index on (..., created, id).
+    """
+    return queryset.filter(Q(created__lt=created) | Q(created=created, id__lt=pk), created__lte=created)
+
+
+class CreatedCursorPagination(BasePagination):
+    """
+    Keyset pagination over (created, id), newest first.
+    Every page is a range scan that starts right after the last row of the previous page, no matter how deep it is.
+    The body stays a plain list, the following page is announced in the `Link` header and in `X-Next-Cursor`.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = 20
+    max_limit = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None:
+                raise NotFound(self.invalid_cursor_message)
+            created, pk = position
+            queryset = seek_after(queryset, created, pk)
+
+        rows = list(queryset.order_by('-created', '-id')[:self.limit + 1])
+        page = rows[:self.limit]
+        self.next_cursor = encode_cursor(page[-1].created, page[-1].id) if len(rows) > self.limit else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        response = Response(data)
+        next_link = self.get_next_link()
+        if next_link is not None:
+            response['Link'] = f'<{next_link}>; rel="next"'
+            response['X-Next-Cursor'] = self.next_cursor
+        return response
+
+
+class OffsetPagination(CreatedCursorPagination):
+    """
+    Limit/offset pages for result sets without a stable key to seek on, such as ranked search results.
+    Same plain list body, with the following page in `Link` and `X-Next-Offset`.
+    """
+    offset_query_param = 'offset'
+    max_limit = 50
+
+    def get_offset(self, request):
+        try:
+            return max(int(request.query_params[self.offset_query_param]), 0)
+        except (KeyError, ValueError):
+            return 0
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        offset = self.get_offset(request)
+        rows = list(queryset[offset:offset + self.limit + 1])
+        self.next_offset = offset + self.limit if len(rows) > self.limit else None
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if self.next_offset is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.offset_query_param, self.next_offset)
+
+    def get_paginated_response(self, data):
+        response = Response(data)
+        next_link = self.get_next_link()
+        if next_link is not None:
+            response['Link'] = f'<{next_link}>; rel="next"'
+            response['X-Next-Offset'] = self.next_offset
+        return response
@@ -0,0 +1,201 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Exists, OuterRef
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from rest_framework.permissions import BasePermission, SAFE_METHODS
+
+from core.models import Workspace, TeamMember, Project, ProjectMember
+
+WORKSPACE_MEMBERS_ONLY = {'error': 'Access restricted to workspace members only'}
+WORKSPACE_ADMINS_ONLY = {'error': 'Access restricted to workspace admins only'}
+PROJECT_MEMBERS_ONLY = {'error': 'Access restricted to project members only'}
+
+# Cached marker for "not a member", so that a miss (None) can be told apart from a negative answer
+_NO_ROLE = ''
+
+
+class Access:
+    def __init__(self, role, project_member):
+        self.role = role
+        self.project_member = project_member
+
+    @property
+    def is_member(self):
+        return self.role is not None
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def can_access(self, project):
+        return self.is_member and (not project.is_private or self.project_member)
+
+
+def role_cache_key(user_id, workspace_id):
+    return f'prism:access:role:{user_id}:{workspace_id}'
+
+
+def project_cache_key(user_id, project_id):
+    return f'prism:access:project:{user_id}:{project_id}'
+
+
+def invalidate_role(user_id, workspace_id):
+    # Dropped after the change commits, a reader of the old row could otherwise cache it again
+    key = role_cache_key(user_id, workspace_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidate_project_membership(user_ids, project_id):
+    keys = [project_cache_key(user_id, project_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _request_memo(request, name):
+    memo = getattr(request, name, None)
+    if memo is None:
+        memo = {}
+        setattr(request, name, memo)
+    return memo
+
+
+def get_project(request, workspace_id, pk):
+    # Scoped to the workspace of the URL, a project of another workspace is a 404 even when it is public
+    projects = _request_memo(request, '_prism_projects')
+    if (workspace_id, pk) not in projects:
+        projects[workspace_id, pk] = get_object_or_404(Project, pk=pk, workspace_id=workspace_id)
+    return projects[workspace_id, pk]
+
+
+def visible_projects(user, workspace_id=None):
+    """
+    Projects `user` may see: the public ones and the private ones they belong to. Membership is an EXISTS probe of
+    the (project, member) index, so every project comes back once however many members it has.
+    Workspace membership is left to the caller.
+    """
+    projects = Project.objects.filter(
+        Q(is_private=False) | Exists(ProjectMember.objects.filter(project=OuterRef('pk'), member=user))
+    )
+    if workspace_id is not None:
+        projects = projects.filter(workspace_id=workspace_id)
+    return projects
+
+
+def resolve_access(request, workspace_id, project=None):
+    """
+    Resolves the workspace role of the requesting user and, for private projects, the project membership.
+    The answer is memoised on the request and optionally cached across requests for ACCESS_CACHE_TIMEOUT seconds,
+    so a request costs at most one query no matter how many checks it performs.
+    """
+    project_id = project.id if project is not None and project.is_private else None
+    accesses = _request_memo(request, '_prism_access')
+    key = (int(workspace_id), project_id)
+    if key in accesses:
+        return accesses[key]
+
+    user_id = request.user.id
+    timeout = settings.ACCESS_CACHE_TIMEOUT
+    role = project_member = None
+    if timeout:
+        role = cache.get(role_cache_key(user_id, workspace_id))
+        if project_id is not None:
+            project_member = cache.get(project_cache_key(user_id, project_id))
+
+    if role is None or (project_id is not None and project_member is None):
+        team_member = TeamMember.objects.filter(member_id=user_id, workspace_id=workspace_id)
+        if project_id is not None:
+            team_member = team_member.annotate(project_member=Exists(
+                ProjectMember.objects.filter(project_id=project_id, member_id=OuterRef('member_id'))
+            ))
+            row = team_member.values_list('role', 'project_member').first()
+        else:
+            row = team_member.values_list('role').first()
+        role = row[0] if row is not None else _NO_ROLE
+        project_member = bool(row[1]) if row is not None and project_id is not None else False
+        if timeout:
+            cache.set(role_cache_key(user_id, workspace_id), role, timeout)
+            if project_id is not None:
+                cache.set(project_cache_key(user_id, project_id), project_member, timeout)
+
+    access = Access(role or None, project_member)
+    accesses[key] = access
+    return access
+
+
+def _workspace_id(view):
+    return view.kwargs.get(getattr(view, 'workspace_url_kwarg', 'workspace_id'))
+
+
+def _deny(permission, workspace_id, message):
+    # Keep the 404 for missing workspaces that the views used to produce before checking membership
+    if not Workspace.objects.filter(pk=workspace_id).exists():
+        raise Http404
+    permission.message = message
+    return False
+
+
+class IsWorkspaceMember(BasePermission):
+    message = WORKSPACE_MEMBERS_ONLY
+
+    def has_permission(self, request, view):
+        workspace_id = _workspace_id(view)
+        if resolve_access(request, workspace_id).is_member:
+            return True
+        return _deny(self, workspace_id, WORKSPACE_MEMBERS_ONLY)
+
+
+class IsWorkspaceAdmin(BasePermission):
+    message = WORKSPACE_ADMINS_ONLY
+
+    def has_permission(self, request, view):
+        workspace_id = _workspace_id(view)
+        if resolve_access(request, workspace_id).is_admin:
+            return True
+        return _deny(self, workspace_id, WORKSPACE_ADMINS_ONLY)
+
+
+class IsWorkspaceAdminOrMemberReadOnly(BasePermission):
+    message = WORKSPACE_ADMINS_ONLY
+
+    def has_permission(self, request, view):
+        workspace_id = _workspace_id(view)
+        access = resolve_access(request, workspace_id)
+        if request.method in SAFE_METHODS:
+            if access.is_member:
+                return True
+            return _deny(self, workspace_id, WORKSPACE_MEMBERS_ONLY)
+        if access.is_admin:
+            return True
+        return _deny(self, workspace_id, WORKSPACE_ADMINS_ONLY)
+
+
+class HasProjectAccess(BasePermission):
+    message = PROJECT_MEMBERS_ONLY
+
+    def has_permission(self, request, view):
+        project = get_project(request, _workspace_id(view), view.kwargs.get('project_id'))
+        access = resolve_access(request, _workspace_id(view), project)
+        if not access.is_member:
+            self.message = WORKSPACE_MEMBERS_ONLY
+            return False
+        if not access.can_access(project):
+            self.message = PROJECT_MEMBERS_ONLY
+            return False
+        return True
+
+
+class CanManageProjectMembers(BasePermission):
+    message = WORKSPACE_ADMINS_ONLY
+
+    def has_permission(self, request, view):
+        project = get_project(request, _workspace_id(view), view.kwargs.get('project_id'))
+        workspace_id = _workspace_id(view)
+        access = resolve_access(request, workspace_id, project)
+        if not project.is_private:
+            if access.is_admin:
+                return True
+            return _deny(self, workspace_id, WORKSPACE_ADMINS_ONLY)
+        if access.project_member:
+            return True
+        return _deny(self, workspace_id, PROJECT_MEMBERS_ONLY)
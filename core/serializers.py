@@ -1,6 +1,8 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 
 from core.models import *
+from core.storage import content_storage
 from user.serializers import CustomUserSerializer
 
 
@@ -10,6 +12,7 @@ class WorkspaceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Workspace
         fields = "__all__"
+        read_only_fields = ('version', 'modified')
 
 
 class TeamMemberSerializer(serializers.ModelSerializer):
@@ -27,9 +30,15 @@ class UpdateSerializer(serializers.ModelSerializer):
 
 
 class WorkspaceImageSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField()
+
     class Meta:
         model = WorkspaceImage
-        fields = "__all__"
+        fields = ('id', 'image', 'digest', 'status', 'variants')
+        read_only_fields = ('digest', 'status')
+
+    def get_variants(self, image):
+        return {name: content_storage.url(path) for name, path in image.variants.items()}
 
 
 class MeetingParticipantSerializer(serializers.ModelSerializer):
@@ -47,6 +56,12 @@ class MeetingSerializer(serializers.ModelSerializer):
         model = Meeting
         fields = "__all__"
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related(
+            Prefetch('meetingparticipant_set', queryset=MeetingParticipant.objects.select_related('participant')),
+        )
+
 
 class ProjectMemberSerializer(serializers.ModelSerializer):
     member = CustomUserSerializer(read_only=True)
@@ -63,6 +78,20 @@ class ProjectSerializer(serializers.ModelSerializer):
     class Meta:
         model = Project
         fields = "__all__"
+        read_only_fields = ('version', 'modified')
+
+
+class ProjectSummarySerializer(serializers.ModelSerializer):
+    tasks = serializers.SerializerMethodField()
+    member_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Project
+        fields = ('id', 'workspace', 'name', 'is_private', 'is_archieved', 'createad_at', 'version', 'modified',
+                  'tasks', 'member_count')
+
+    def get_tasks(self, project):
+        return {column: getattr(project, f'{column}_tasks') for column, _ in Task.COLUMN_OPTIONS}
 
 
 class SubTaskSerializer(serializers.ModelSerializer):
@@ -93,3 +122,13 @@ class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
         fields = "__all__"
+        read_only_fields = ('subtasks_total', 'subtasks_done')
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Loads every nested relation in one query each, whatever the number of tasks
+        return queryset.prefetch_related(
+            'dependecy_taksks',
+            Prefetch('taskmember_set', queryset=TaskMember.objects.select_related('member')),
+            'subtask_set',
+        )
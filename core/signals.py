@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from core.broker import publish_event, publish_access_change
+from core.closure import add_dependency_edge, prepare_edge_removal, remove_dependency_edge
+from core.directory import DIRECTORY_USER_FIELDS, invalidate_directories
+from core.models import *
+from core.permissions import invalidate_role, invalidate_project_membership
+from core.serializers import UpdateSerializer
+from core.stats import task_stat_deltas, apply_stat_deltas, assignee_stat_key, remember_stat_values
+from core.utils import touch_workspace, touch_project, refresh_subtask_progress
+
+_bulk_task_deletion = ContextVar('prism_bulk_task_deletion', default=False)
+
+
+@contextmanager
+def bulk_task_deletion():
+    """
+    Silences the per row handlers of tasks and of their relations while tasks are deleted in bulk. The caller applies
+    the stats, closure and event changes of the whole set itself.
+    """
+    token = _bulk_task_deletion.set(True)
+    try:
+        yield
+    finally:
+        _bulk_task_deletion.reset(token)
+
+
+@receiver([post_save, post_delete], sender=TeamMember)
+def teammember_changed(sender, instance, **kwargs):
+    invalidate_role(instance.member_id, instance.workspace_id)
+    invalidate_directories([instance.workspace_id])
+    publish_access_change(instance.workspace_id, [instance.member_id])
+
+
+@receiver(post_save, sender=PrismUser)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and DIRECTORY_USER_FIELDS.isdisjoint(update_fields)):
+        return
+    invalidate_directories(TeamMember.objects.filter(member=instance).values_list('workspace_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=ProjectMember)
+def projectmember_changed(sender, instance, **kwargs):
+    invalidate_project_membership([instance.member_id], instance.project_id)
+    workspace_id = Project.objects.filter(pk=instance.project_id).values_list('workspace_id', flat=True).first()
+    if workspace_id is not None:
+        publish_access_change(workspace_id, [instance.member_id])
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, created, **kwargs):
+    if not created:
+        # The project may have turned private or public
+        publish_access_change(instance.workspace_id)
+
+
+@receiver(post_save, sender=Update)
+def update_created(sender, instance, created, **kwargs):
+    if created:
+        publish_event(instance.workspace_id, 'update', UpdateSerializer(instance).data)
+
+
+@receiver([post_save, post_delete], sender=Update)
+@receiver([post_save, post_delete], sender=Meeting)
+def workspace_feed_changed(sender, instance, **kwargs):
+    touch_workspace(pk=instance.workspace_id)
+
+
+@receiver([post_save, post_delete], sender=MeetingParticipant)
+def meeting_participant_changed(sender, instance, **kwargs):
+    touch_workspace(meeting__id=instance.meeting_id)
+
+
+@receiver([post_save, post_delete], sender=Task)
+def task_changed(sender, instance, **kwargs):
+    if _bulk_task_deletion.get():
+        return
+    touch_project(pk=instance.project_id)
+    publish_event(instance.project.workspace_id, 'task', {
+        'id': instance.id,
+        'project': instance.project_id,
+        'name': instance.name,
+        'column': instance.column,
+        'index': instance.index,
+        'deleted': kwargs['signal'] is post_delete,
+    })
+
+
+@receiver([post_save, post_delete], sender=SubTask)
+def subtask_changed(sender, instance, **kwargs):
+    if _bulk_task_deletion.get():
+        return
+    refresh_subtask_progress([instance.task_id])
+
+
+@receiver([post_save, post_delete], sender=SubTask)
+@receiver([post_save, post_delete], sender=TaskMember)
+@receiver([post_save, post_delete], sender=TaskDependency)
+def task_relation_changed(sender, instance, **kwargs):
+    if _bulk_task_deletion.get():
+        return
+    touch_project(task__id=instance.task_id)
+    task = Task.objects.filter(pk=instance.task_id).values_list('project_id', 'project__workspace_id').first()
+    if task is not None:
+        publish_event(task[1], 'task', {'id': instance.task_id, 'project': task[0], 'changed': sender.__name__})
+
+
+@receiver(post_save, sender=TaskDependency)
+def dependency_created(sender, instance, created, **kwargs):
+    if created:
+        add_dependency_edge(instance.task_id, instance.dependency_id)
+
+
+@receiver(pre_delete, sender=TaskDependency)
+def dependency_deleting(sender, instance, **kwargs):
+    if _bulk_task_deletion.get():
+        return
+    # Before any row of a cascading task deletion is gone, while the closure still holds the chains through the edge
+    instance._closure_removal = prepare_edge_removal(instance.task_id, instance.dependency_id)
+
+
+@receiver(post_delete, sender=TaskDependency)
+def dependency_deleted(sender, instance, **kwargs):
+    # After every dependency of a cascade is gone, so none of them keeps a pair alive
+    removal = getattr(instance, '_closure_removal', None)
+    if removal is not None:
+        remove_dependency_edge(*removal)
+
+
+@receiver(post_save, sender=Task)
+def task_stats_saved(sender, instance, created, **kwargs):
+    apply_stat_deltas(*task_stat_deltas(instance, created=created))
+    remember_stat_values(instance)
+
+
+@receiver(post_delete, sender=Task)
+def task_stats_deleted(sender, instance, **kwargs):
+    if _bulk_task_deletion.get():
+        return
+    apply_stat_deltas(*task_stat_deltas(instance, deleted=True))
+
+
+@receiver([post_save, post_delete], sender=TaskMember)
+def assignee_stats_changed(sender, instance, **kwargs):
+    if _bulk_task_deletion.get() or kwargs.get('created') is False:
+        return
+    task = Task.objects.filter(pk=instance.task_id).values_list('project_id', 'column').first()
+    if task is not None:
+        delta = -1 if kwargs['signal'] is post_delete else 1
+        apply_stat_deltas(assignee_deltas={assignee_stat_key(task[0], instance.member_id, task[1]): delta})
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite' and settings.SQLITE_WAL:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode = WAL')
+            cursor.execute('PRAGMA synchronous = NORMAL')
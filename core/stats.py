@@ -0,0 +1,164 @@
+from collections import Counter
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, Count, Sum, Value, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from core.models import Task, TaskMember, TaskStat, AssigneeStat, ProjectMember
+
+STAT_FIELDS = ('project_id', 'column', 'priority', 'deadline')
+
+
+def _due(deadline):
+    return timezone.localtime(deadline).date() if deadline is not None else None
+
+
+def task_stat_key(project_id, column, priority, deadline):
+    return (('project_id', project_id), ('column', column), ('priority', priority), ('due', _due(deadline)))
+
+
+def assignee_stat_key(project_id, member_id, column):
+    return (('project_id', project_id), ('member_id', member_id), ('column', column))
+
+
+def _apply(model, deltas):
+    emptied = set()
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        lookup = dict(key)
+        updated = model.objects.filter(**lookup).update(tasks=F('tasks') + delta)
+        if delta < 0:
+            emptied.add(lookup['project_id'])
+        elif not updated:
+            try:
+                with transaction.atomic():
+                    model.objects.create(tasks=delta, **lookup)
+            except IntegrityError:
+                # Created concurrently by another writer
+                model.objects.filter(**lookup).update(tasks=F('tasks') + delta)
+    if emptied:
+        model.objects.filter(project_id__in=emptied, tasks__lte=0).delete()
+
+
+def apply_stat_deltas(task_deltas=None, assignee_deltas=None):
+    _apply(TaskStat, task_deltas or {})
+    _apply(AssigneeStat, assignee_deltas or {})
+
+
+def task_stat_deltas(task, created=False, deleted=False, member_ids=None):
+    """
+    Changes to the summary rows caused by saving or deleting `task`, compared with the values it was loaded with.
+    Returns the task deltas and the assignee deltas; `member_ids` saves the assignee query when already known.
+    """
+    task_deltas, assignee_deltas = Counter(), Counter()
+    loaded = getattr(task, '_loaded_values', None)
+    old = None
+    if not created:
+        if loaded is None or any(field not in loaded for field in STAT_FIELDS):
+            loaded = Task.objects.filter(pk=task.pk).values(*STAT_FIELDS).first() if not deleted else None
+        if loaded is not None:
+            old = task_stat_key(*(loaded[field] for field in STAT_FIELDS))
+    new = None if deleted else task_stat_key(task.project_id, task.column, task.priority, task.deadline)
+    if old == new:
+        return task_deltas, assignee_deltas
+
+    if old is not None:
+        task_deltas[old] -= 1
+    if new is not None:
+        task_deltas[new] += 1
+
+    # Assignees of deleted tasks are handled by the deletion of their TaskMember rows
+    old_column = loaded['column'] if old is not None else None
+    if not created and not deleted and old_column != task.column:
+        if member_ids is None:
+            member_ids = TaskMember.objects.filter(task=task).values_list('member_id', flat=True)
+        for member_id in member_ids:
+            assignee_deltas[assignee_stat_key(loaded['project_id'], member_id, old_column)] -= 1
+            assignee_deltas[assignee_stat_key(task.project_id, member_id, task.column)] += 1
+    return task_deltas, assignee_deltas
+
+
+def lock_stat_values(tasks):
+    """
+    Locks the rows of `tasks` and refreshes their summary fields from them, as the copies in memory may have been
+    made stale by a concurrent write. Call inside the saving transaction, before changing the tasks.
+    """
+    tasks = {task.pk: task for task in tasks}
+    for row in Task.objects.select_for_update().filter(pk__in=tasks).values('id', *STAT_FIELDS):
+        task = tasks[row.pop('id')]
+        for field, value in row.items():
+            setattr(task, field, value)
+        task._loaded_values = row
+
+
+def remember_stat_values(task):
+    task._loaded_values = {field: getattr(task, field) for field in STAT_FIELDS}
+
+
+def rebuild_task_stats(project_id):
+    """
+    Recomputes the summary rows of a project from its tasks. Returns the number of rows.
+    """
+    tasks = (Task.objects.filter(project_id=project_id).order_by()
+             .values('column', 'priority', due=TruncDate('deadline')).annotate(tasks=Count('id')))
+    members = (TaskMember.objects.filter(task__project_id=project_id).order_by()
+               .values('member_id', column=F('task__column')).annotate(tasks=Count('id')))
+    task_rows = [TaskStat(project_id=project_id, **row) for row in tasks]
+    assignee_rows = [AssigneeStat(project_id=project_id, **row) for row in members]
+    with transaction.atomic():
+        TaskStat.objects.filter(project_id=project_id).delete()
+        AssigneeStat.objects.filter(project_id=project_id).delete()
+        TaskStat.objects.bulk_create(task_rows)
+        AssigneeStat.objects.bulk_create(assignee_rows)
+    return len(task_rows) + len(assignee_rows)
+
+
+def summarise_task_stats(projects):
+    """
+    Dashboard counters of the given projects, read from the summary rows only.
+    """
+    today = timezone.localdate()
+    columns = Counter({column: 0 for column, _ in Task.COLUMN_OPTIONS})
+    priorities = Counter({priority: 0 for priority, _ in Task.TASK_PRIORITIES})
+    per_project, overdue, due_today = Counter(), 0, 0
+    for row in TaskStat.objects.filter(project__in=projects).values('project_id', 'column', 'priority', 'due', 'tasks'):
+        columns[row['column']] += row['tasks']
+        priorities[row['priority']] += row['tasks']
+        per_project[row['project_id']] += row['tasks']
+        if row['due'] is not None and row['column'] != 'complete':
+            if row['due'] < today:
+                overdue += row['tasks']
+            elif row['due'] == today:
+                due_today += row['tasks']
+
+    assignees = {}
+    for row in AssigneeStat.objects.filter(project__in=projects).values('member_id', 'column', 'tasks'):
+        counts = assignees.setdefault(row['member_id'], {column: 0 for column, _ in Task.COLUMN_OPTIONS})
+        counts[row['column']] += row['tasks']
+
+    return {
+        'tasks': sum(columns.values()),
+        'columns': dict(columns),
+        'priorities': dict(priorities),
+        'overdue': overdue,
+        'due_today': due_today,
+        'assignees': assignees,
+        'projects': dict(per_project),
+    }
+
+
+def with_project_counts(projects):
+    """
+    Annotates the task count of every column (`<column>_tasks`, from the summary rows) and the member count of each
+    project, as correlated subqueries of the one project query.
+    """
+    def total(rows, field):
+        rows = rows.order_by().values('project').annotate(total=field).values('total')
+        return Coalesce(Subquery(rows), Value(0))
+
+    stats = TaskStat.objects.filter(project=OuterRef('pk'))
+    counts = {f'{column}_tasks': total(stats.filter(column=column), Sum('tasks')) for column, _ in Task.COLUMN_OPTIONS}
+    counts['member_count'] = total(ProjectMember.objects.filter(project=OuterRef('pk')), Count('id'))
+    return projects.annotate(**counts)
@@ -0,0 +1,42 @@
+import os
+import uuid
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Storage for files named after a hash of their content: a name always holds the same bytes, so a file that exists
+    already is kept instead of saved again under a new name, and concurrent writers of one name are harmless.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+        partial_path = f'{full_path}.{uuid.uuid4().hex}.partial'
+        if hasattr(content, 'temporary_file_path'):
+            # Uploads streamed to disk are moved, not copied
+            file_move_safe(content.temporary_file_path(), partial_path)
+        else:
+            with open(partial_path, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(partial_path, self.file_permissions_mode)
+        os.replace(partial_path, full_path)
+        return name
+
+
+content_storage = ContentAddressedStorage()
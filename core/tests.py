@@ -1,3 +1,1222 @@
-from django.test import TestCase
+import os
+import re
+import socket
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from io import BytesIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.models import *
+from core.batch import parse_task_batch, apply_task_batch
+from core.closure import rebuild_closure
+from core.directory import build_directory, directory_cache_key, directory_version
+from core.images import process_pending_images
+from core.ordering import rebalance_column, move_task, TASK_INDEX_GAP
+from core.pagination import seek_after
+from core.permissions import (resolve_access, role_cache_key, project_cache_key, WORKSPACE_MEMBERS_ONLY,
+                              PROJECT_MEMBERS_ONLY)
+from core.stats import rebuild_task_stats
+from core.utils import deliver_queued_emails
+from user.models import UserSearchTerm
+from prism.asgi import application
+from prism.routers import ReplicaRouter
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+def create_user(name):
+    return PrismUser.objects.create_user(f'{name}@prism.test', name, name.title(), 'Tester', '', '', 'password123')
+
+
+class PrismTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.member = create_user('member')
+        cls.workspace = Workspace.objects.create(name='Prism', owner=cls.owner)
+        TeamMember.objects.create(workspace=cls.workspace, member=cls.owner, role='admin')
+        TeamMember.objects.create(workspace=cls.workspace, member=cls.member, role='member')
+        cls.project = Project.objects.create(workspace=cls.workspace, name='Board')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def project_url(self, suffix=''):
+        return f'/api/workspace/{self.workspace.id}/projects/{self.project.id}/{suffix}'
+
+    def create_tasks(self, count, column='todo'):
+        start = Task.objects.filter(project=self.project).count()
+        tasks = [Task.objects.create(project=self.project, name=f'Task {start + i}', column=column, index=start + i)
+                 for i in range(count)]
+        for task in tasks:
+            TaskMember.objects.create(task=task, member=self.member)
+            SubTask.objects.create(task=task, name=f'{task.name} subtask')
+            if task.index:
+                TaskDependency.objects.create(task=task, dependency=tasks[0])
+        return tasks
+
+    def count_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        return response, len(context.captured_queries)
+
+
+class AccessResolutionTest(PrismTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.secret = Project.objects.create(workspace=self.workspace, name='Secret', is_private=True)
+        ProjectMember.objects.create(project=self.secret, member=self.owner)
+
+    def test_role_and_project_membership_take_one_query(self):
+        request = SimpleNamespace(user=self.owner)
+        with self.assertNumQueries(1):
+            access = resolve_access(request, self.workspace.id, self.secret)
+        self.assertEqual(access.role, 'admin')
+        self.assertTrue(access.can_access(self.secret))
+        # Memoised on the request for the other checks of the same request
+        with self.assertNumQueries(0):
+            resolve_access(request, self.workspace.id, self.secret)
+
+        with self.assertNumQueries(1):
+            access = resolve_access(SimpleNamespace(user=self.member), self.workspace.id, self.secret)
+        self.assertTrue(access.is_member)
+        self.assertFalse(access.can_access(self.secret))
+
+    @override_settings(ACCESS_CACHE_TIMEOUT=60)
+    def test_cached_access_is_dropped_when_the_change_commits(self):
+        cache.clear()
+        resolve_access(SimpleNamespace(user=self.member), self.workspace.id, self.secret)
+        keys = [role_cache_key(self.member.id, self.workspace.id), project_cache_key(self.member.id, self.secret.id)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            TeamMember.objects.filter(member=self.member).get().save()
+            ProjectMember.objects.create(project=self.secret, member=self.member)
+        self.assertEqual(len(cache.get_many(keys)), 2)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(cache.get_many(keys), {})
+
+    def test_missing_workspaces_and_projects_are_not_found(self):
+        self.assertEqual(self.client.get('/api/workspace/999999/stats/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/workspace/{self.workspace.id}/projects/999999/tasks/').status_code,
+                         404)
+
+    def test_projects_of_other_workspaces_are_not_found(self):
+        other = Workspace.objects.create(name='Other', owner=create_user('stranger'))
+        foreign = Project.objects.create(workspace=other, name='Public')
+        url = f'/api/workspace/{self.workspace.id}/projects/{foreign.id}/'
+        for suffix in ('tasks/', 'board/', 'stats/', 'schedule/'):
+            self.assertEqual(self.client.get(url + suffix).status_code, 404, suffix)
+        operations = [{'op': 'create', 'data': {'name': 'Planted'}}]
+        response = self.client.post(url + 'tasks/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Task.objects.filter(project=foreign).exists())
+
+    def test_outsiders_and_non_project_members_are_forbidden(self):
+        self.client.force_authenticate(create_user('outsider'))
+        response = self.client.get(f'/api/workspace/{self.workspace.id}/stats/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data, WORKSPACE_MEMBERS_ONLY)
+
+        self.client.force_authenticate(self.member)
+        response = self.client.get(f'/api/workspace/{self.workspace.id}/projects/{self.secret.id}/tasks/')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data, PROJECT_MEMBERS_ONLY)
+
+
+class TaskListQueryCountTest(PrismTestCase):
+
+    def test_board_query_count_does_not_grow_with_tasks(self):
+        self.create_tasks(2)
+        response, small_board_queries = self.count_queries('get', self.project_url('tasks/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+        self.create_tasks(30)
+        response, large_board_queries = self.count_queries('get', self.project_url('tasks/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 32)
+        self.assertEqual(small_board_queries, large_board_queries)
+
+    def test_board_payload_keeps_nested_relations(self):
+        self.create_tasks(2)
+        response = self.client.get(self.project_url('tasks/'))
+        task = response.data[1]
+        self.assertEqual(task['taskmember_set'][0]['member']['user_name'], 'member')
+        self.assertEqual(len(task['subtask_set']), 1)
+        self.assertEqual(len(task['dependecy_taksks']), 1)
+
+
+class ProjectBoardTest(PrismTestCase):
+
+    def test_board_payload_shape(self):
+        tasks = self.create_tasks(2) + self.create_tasks(1, column='doing')
+        response = self.client.get(self.project_url('board/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'project', 'columns', 'users'})
+        self.assertEqual(response.data['project'], self.project.id)
+
+        columns = response.data['columns']
+        self.assertEqual(set(columns), {'todo', 'doing', 'complete'})
+        self.assertEqual([task['id'] for task in columns['todo']], [tasks[0].id, tasks[1].id])
+        self.assertEqual([task['id'] for task in columns['doing']], [tasks[2].id])
+        self.assertEqual(columns['complete'], [])
+
+        task = columns['todo'][1]
+        self.assertEqual(set(task), {'id', 'name', 'index', 'created', 'deadline', 'priority', 'duration',
+                                     'subtasks_done', 'subtasks_total', 'members', 'dependencies'})
+        self.assertEqual(task['members'], [self.member.id])
+        self.assertEqual(task['dependencies'], [tasks[0].id])
+        self.assertEqual(task['subtasks_total'], 1)
+
+        self.assertEqual(list(response.data['users']), [self.member.id])
+        self.assertEqual(response.data['users'][self.member.id]['user_name'], 'member')
+
+
+class ConditionalFeedTest(PrismTestCase):
+
+    def feed_urls(self):
+        return [
+            self.project_url('board/'),
+            self.project_url('tasks/'),
+            f'/api/workspace/{self.workspace.id}/updates/',
+            f'/api/workspace/{self.workspace.id}/meetings/',
+        ]
+
+    def test_unchanged_feeds_are_not_modified(self):
+        self.create_tasks(2)
+        for url in self.feed_urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response['Cache-Control'])
+                # Whole second dates would miss a write made in the same second, the ETag is the only validator
+                self.assertNotIn('Last-Modified', response)
+
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_writes_change_the_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.feed_urls()}
+        # Creating a task also posts an update to the workspace feed
+        response = self.client.post(self.project_url('tasks/'), {'name': 'Fresh', 'column': 'todo'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+
+class UpdateFeedPaginationTest(PrismTestCase):
+
+    def feed_url(self):
+        return f'/api/workspace/{self.workspace.id}/updates/'
+
+    def test_cursor_walks_the_feed_without_gaps_or_repeats(self):
+        created = timezone.now()
+        # Every timestamp is shared by three updates, so that ties have to be broken by id
+        Update.objects.bulk_create([
+            Update(workspace=self.workspace, message=f'Update {i}', created=created - timedelta(seconds=i // 3))
+            for i in range(45)
+        ])
+        expected = list(Update.objects.order_by('-created', '-id').values_list('message', flat=True))
+
+        messages, cursor = [], None
+        while True:
+            response = self.client.get(self.feed_url(), {'limit': 20, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            messages += [update['message'] for update in response.data]
+            cursor = response.get('X-Next-Cursor')
+            if cursor is None:
+                break
+        self.assertEqual(messages, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.feed_url(), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class DependencyScheduleTest(PrismTestCase):
+
+    def add_dependency(self, task, dependency):
+        return self.client.post(self.project_url(f'tasks/{task.id}/dependency/'), {'dependency': dependency.id},
+                                format='json')
+
+    def test_cycles_are_rejected(self):
+        design, build, ship = [Task.objects.create(project=self.project, name=name) for name in ('d', 'b', 's')]
+        self.assertEqual(self.add_dependency(build, design).status_code, 201)
+        self.assertEqual(self.add_dependency(ship, build).status_code, 201)
+
+        response = self.add_dependency(design, ship)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['cycle'], [ship.id, build.id, design.id, ship.id])
+        self.assertEqual(TaskDependency.objects.count(), 2)
+
+    def test_schedule_reports_critical_path(self):
+        design = Task.objects.create(project=self.project, name='Design', duration=2)
+        backend = Task.objects.create(project=self.project, name='Backend', duration=5)
+        frontend = Task.objects.create(project=self.project, name='Frontend', duration=3)
+        release = Task.objects.create(project=self.project, name='Release', duration=1)
+        for task, dependency in ((backend, design), (frontend, design), (release, backend), (release, frontend)):
+            self.assertEqual(self.add_dependency(task, dependency).status_code, 201)
+
+        response = self.client.get(self.project_url('schedule/'), {'start': '2021-08-02'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['duration'], 8)
+        self.assertEqual(response.data['critical_path'], [design.id, backend.id, release.id])
+        self.assertEqual(response.data['order'], [design.id, backend.id, frontend.id, release.id])
+        slack = {task['id']: task['slack'] for task in response.data['tasks']}
+        self.assertEqual(slack[frontend.id], 2)
+
+        Task.objects.filter(pk=backend.pk).update(column='complete')
+        TaskDependency.objects.filter(task=release, dependency=backend).delete()
+        response = self.client.get(self.project_url('schedule/'), {'start': '2021-08-02'})
+        self.assertEqual(response.data['critical_path'], [design.id, frontend.id, release.id])
+
+
+class TaskClosureTest(PrismTestCase):
+
+    def closure(self):
+        return set(TaskClosure.objects.values_list('upstream_id', 'downstream_id'))
+
+    def test_closure_follows_dependency_writes(self):
+        a, b, c, d = [Task.objects.create(project=self.project, name=name) for name in 'abcd']
+        for task, dependency in ((b, a), (c, a), (d, b), (d, c)):
+            TaskDependency.objects.create(task=task, dependency=dependency)
+        self.assertIn((a.id, d.id), self.closure())
+
+        TaskDependency.objects.get(task=d, dependency=b).delete()
+        self.assertIn((a.id, d.id), self.closure())
+        self.assertNotIn((b.id, d.id), self.closure())
+
+        c.delete()
+        self.assertEqual(self.closure(), {(a.id, b.id)})
+
+        response = self.client.get(self.project_url(f'tasks/{b.id}/blocking/'))
+        self.assertEqual(response.data, {'task': b.id, 'upstream': [a.id], 'downstream': [], 'blocked': True})
+
+    def test_deleting_a_task_drops_chains_through_any_of_its_edges(self):
+        a, b, x, c, d = [Task.objects.create(project=self.project, name=name) for name in 'abxcd']
+        # a and b reach d only through x, over different edges in and out of it
+        for task, dependency in ((x, a), (x, b), (c, x), (d, x), (d, c)):
+            TaskDependency.objects.create(task=task, dependency=dependency)
+        x.delete()
+        self.assertEqual(self.closure(), {(c.id, d.id)})
+
+    def test_long_chains_do_not_overflow(self):
+        tasks = [Task.objects.create(project=self.project, name=str(i)) for i in range(100)]
+        # Each task waits for the two before it, the number of chains from the first grows like Fibonacci
+        TaskDependency.objects.bulk_create(
+            [TaskDependency(task=task, dependency=tasks[i - 1]) for i, task in enumerate(tasks) if i > 0]
+            + [TaskDependency(task=task, dependency=tasks[i - 2]) for i, task in enumerate(tasks) if i > 1]
+        )
+        rebuild_closure(self.project.id)
+        TaskDependency.objects.create(task=Task.objects.create(project=self.project, name='last'),
+                                      dependency=tasks[-1])
+        TaskDependency.objects.get(task=tasks[50], dependency=tasks[49]).delete()
+        closure = self.closure()
+        self.assertIn((tasks[0].id, tasks[99].id), closure)
+        self.assertNotIn((tasks[49].id, tasks[50].id), closure)
+        self.assertEqual(len(closure), 100 * 99 // 2 + 100 - 1)
+
+    def test_rebuild_matches_incremental_index(self):
+        tasks = [Task.objects.create(project=self.project, name=str(i)) for i in range(6)]
+        for i, task in enumerate(tasks[1:], start=1):
+            TaskDependency.objects.create(task=task, dependency=tasks[i - 1])
+            if i > 1:
+                TaskDependency.objects.create(task=task, dependency=tasks[i - 2])
+        TaskDependency.objects.get(task=tasks[3], dependency=tasks[2]).delete()
+        incremental = self.closure()
+        rebuild_closure(self.project.id)
+        self.assertEqual(self.closure(), incremental)
+
+
+class TaskMoveTest(PrismTestCase):
+
+    def move(self, task, **data):
+        return self.client.post(self.project_url(f'tasks/{task.id}/move/'), data, format='json')
+
+    def column_order(self, column):
+        return list(Task.objects.filter(project=self.project, column=column).order_by('index')
+                    .values_list('id', flat=True))
+
+    def test_task_is_placed_between_its_neighbours(self):
+        tasks = self.create_tasks(3)
+        rebalance_column(self.project.id, 'todo')
+        response = self.move(tasks[2], after=tasks[0].id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.column_order('todo'), [tasks[0].id, tasks[2].id, tasks[1].id])
+        # Only the moved task got a new key
+        self.assertEqual(list(Task.objects.filter(pk__in=[tasks[0].id, tasks[1].id]).order_by('id')
+                              .values_list('index', flat=True)), [TASK_INDEX_GAP, 2 * TASK_INDEX_GAP])
+
+        self.move(tasks[1], before=tasks[0].id)
+        self.assertEqual(self.column_order('todo'), [tasks[1].id, tasks[0].id, tasks[2].id])
+
+    def test_column_is_rebalanced_when_keys_run_out(self):
+        tasks = self.create_tasks(3)  # keys 0, 1, 2 leave no room between neighbours
+        response = self.move(tasks[2], before=tasks[1].id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.column_order('todo'), [tasks[0].id, tasks[2].id, tasks[1].id])
+        indexes = list(Task.objects.filter(project=self.project).order_by('index').values_list('index', flat=True))
+        self.assertTrue(all(upper - lower >= 2 for lower, upper in zip(indexes, indexes[1:])))
+
+    def test_anchor_in_another_column_moves_the_task_there(self):
+        todo = self.create_tasks(2)
+        doing = self.create_tasks(2, column='doing')
+        response = self.move(todo[1], column='todo', after=doing[0].id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['column'], 'doing')
+        self.assertEqual(self.column_order('doing'), [doing[0].id, todo[1].id, doing[1].id])
+        self.assertEqual(self.column_order('todo'), [todo[0].id])
+        self.assertTrue(Update.objects.filter(message__contains='moved from todo to doing').exists())
+
+    def test_anchors_without_a_key_are_renumbered_first(self):
+        tasks = self.create_tasks(3)
+        Task.objects.filter(pk=tasks[1].pk).update(index=None)
+        response = self.move(tasks[0], after=tasks[1].id)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Task.objects.filter(project=self.project, index__isnull=True).exists())
+        self.assertEqual(self.column_order('todo')[-2:], [tasks[1].id, tasks[0].id])
+
+    def test_invalid_moves_are_rejected(self):
+        tasks = self.create_tasks(2)
+        other = Task.objects.create(project=Project.objects.create(workspace=self.workspace, name='Other'),
+                                    name='Elsewhere', index=TASK_INDEX_GAP)
+        self.assertEqual(self.move(tasks[0], column='done').status_code, 400)
+        self.assertEqual(self.move(tasks[0], after=other.id).status_code, 400)
+        self.assertEqual(self.move(tasks[0], after=tasks[1].id, before=tasks[1].id).status_code, 400)
+
+
+class TaskBatchTest(PrismTestCase):
+
+    def batch(self, operations):
+        return self.count_queries('post', self.project_url('tasks/batch/'), {'operations': operations})
+
+    def test_batch_is_applied_with_one_update_entry(self):
+        keep, move, drop = self.create_tasks(3)
+        response, queries = self.batch([
+            {'op': 'create', 'data': {'name': 'New', 'column': 'doing'}, 'members': [self.member.id]},
+            {'op': 'update', 'id': move.id, 'data': {'column': 'complete', 'priority': 'high'}, 'members': []},
+            {'op': 'update', 'id': keep.id, 'data': {'priority': 'mid'}},
+            {'op': 'delete', 'id': drop.id},
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['created'][0]['taskmember_set'][0]['member']['id'], self.member.id)
+        self.assertEqual(response.data['deleted'], [drop.id])
+
+        move.refresh_from_db()
+        self.assertEqual((move.column, move.priority), ('complete', 'high'))
+        self.assertFalse(TaskMember.objects.filter(task=move).exists())
+        self.assertFalse(Task.objects.filter(pk=drop.pk).exists())
+        self.assertEqual(Update.objects.get().message,
+                         'Tasks for Project Board changed by owner: 1 created, 2 updated, 1 moved, 1 deleted')
+
+        created = [self.count_queries('post', self.project_url('tasks/batch/'), {'operations': [
+            {'op': 'create', 'data': {'name': f'Task {i}'}} for i in range(count)
+        ]})[1] for count in (1, 2, 20)]
+        # The first batch also creates the summary row of its column
+        self.assertEqual(created[1], created[2])
+
+    def test_deletes_are_accounted_for_the_whole_set(self):
+        tasks = self.create_tasks(24)
+        # tasks[1] reaches tasks[3] only through tasks[2]
+        TaskDependency.objects.create(task=tasks[2], dependency=tasks[1])
+        TaskDependency.objects.create(task=tasks[3], dependency=tasks[2])
+        with self.captureOnCommitCallbacks() as callbacks:
+            _, few = self.batch([{'op': 'delete', 'id': task.id} for task in tasks[2:4]])
+        self.assertEqual(len(callbacks), 2, 'one update and one tasks event, none per deleted task')
+        _, many = self.batch([{'op': 'delete', 'id': task.id} for task in tasks[4:22]])
+        self.assertEqual(few, many)
+
+        closure = set(TaskClosure.objects.values_list('upstream_id', 'downstream_id'))
+        self.assertNotIn((tasks[1].id, tasks[3].id), closure)
+        rebuild_closure(self.project.id)
+        self.assertEqual(set(TaskClosure.objects.values_list('upstream_id', 'downstream_id')), closure)
+        maintained = (sorted(TaskStat.objects.values_list('column', 'priority', 'tasks')),
+                      sorted(AssigneeStat.objects.values_list('member_id', 'column', 'tasks')))
+        self.assertEqual(maintained, ([('todo', 'low', 4)], [(self.member.id, 'todo', 4)]))
+
+    def test_invalid_operation_rejects_the_whole_batch(self):
+        task, = self.create_tasks(1)
+        response, _ = self.batch([
+            {'op': 'update', 'id': task.id, 'data': {'column': 'done'}},
+            {'op': 'delete', 'id': 0},
+            {'op': 'create', 'data': {'name': 'Ok'}},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('column', response.data['operations'][0])
+        self.assertEqual(response.data['operations'][1], {'id': 'Invalid task id'})
+        self.assertIsNone(response.data['operations'][2])
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_malformed_bodies_are_rejected(self):
+        for body in ([{'op': 'create'}], 'operations', 5):
+            with self.subTest(body=body):
+                response = self.client.post(self.project_url('tasks/batch/'), body, format='json')
+                self.assertEqual(response.status_code, 400)
+
+        response, _ = self.batch([
+            {'op': 'create', 'data': ['name'], 'members': [self.member.id]},
+            {'op': 'create', 'data': {'name': 'Ok'}, 'members': self.member.id},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['operations'], [{'data': 'Expected an object'},
+                                                       {'members': 'Invalid member ids'}])
+
+
+class SubTaskProgressTest(PrismTestCase):
+
+    def board_task(self, task):
+        board = self.client.get(self.project_url('board/')).data
+        return next(item for item in board['columns'][task.column] if item['id'] == task.id)
+
+    def test_bulk_subtasks_keep_progress_counters(self):
+        task = Task.objects.create(project=self.project, name='Release')
+        response = self.client.post(self.project_url(f'tasks/{task.id}/subtasks/bulk/'), {
+            'create': ['Changelog', {'name': 'Tag', 'status': True}, 'Announce'],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['subtasks_done'], response.data['subtasks_total']), (1, 3))
+
+        changelog, tag, _ = [subtask['id'] for subtask in response.data['subtasks']]
+        response = self.client.post(self.project_url(f'tasks/{task.id}/subtasks/bulk/'), {
+            'done': [changelog], 'undone': [tag, 'x'],
+        }, format='json')
+        self.assertEqual(response.data['rejected'], ['x'])
+        self.assertEqual((response.data['subtasks_done'], response.data['subtasks_total']), (1, 3))
+
+        SubTask.objects.get(pk=tag).delete()
+        self.assertEqual((self.board_task(task)['subtasks_done'], self.board_task(task)['subtasks_total']), (1, 2))
+
+    def test_board_does_not_load_subtasks(self):
+        self.create_tasks(3)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.project_url('board/'))
+        self.assertFalse(any('core_subtask' in query['sql'] for query in context.captured_queries))
+
+
+class TaskStatsTest(PrismTestCase):
+
+    def stat_rows(self):
+        return (sorted(TaskStat.objects.values_list('project_id', 'column', 'priority', 'due', 'tasks')),
+                sorted(AssigneeStat.objects.values_list('project_id', 'member_id', 'column', 'tasks')))
+
+    def test_summary_rows_follow_task_writes(self):
+        overdue = timezone.now() - timedelta(days=3)
+        first, second, third = self.create_tasks(3)
+        self.client.patch(self.project_url(f'tasks/{first.id}/'), {'column': 'doing', 'deadline': overdue},
+                          format='json')
+        self.client.post(self.project_url(f'tasks/{second.id}/move/'), {'column': 'complete'}, format='json')
+        self.client.delete(self.project_url(f'tasks/{third.id}/'))
+        self.client.post(self.project_url('tasks/batch/'), {'operations': [
+            {'op': 'create', 'data': {'name': 'Batch', 'priority': 'high'}, 'members': [self.owner.id]},
+            {'op': 'update', 'id': first.id, 'data': {'column': 'todo'}, 'members': [self.owner.id]},
+        ]}, format='json')
+
+        maintained = self.stat_rows()
+        rebuild_task_stats(self.project.id)
+        self.assertEqual(self.stat_rows(), maintained)
+
+        response = self.client.get(self.project_url('stats/'))
+        self.assertEqual(response.data['tasks'], 3)
+        self.assertEqual(response.data['columns'], {'todo': 2, 'doing': 0, 'complete': 1})
+        self.assertEqual(response.data['priorities'], {'high': 1, 'mid': 0, 'low': 2})
+        self.assertEqual(response.data['overdue'], 1)
+        self.assertEqual(response.data['assignees'][self.owner.id], {'todo': 2, 'doing': 0, 'complete': 0})
+
+    def test_stale_copies_move_the_task_from_its_current_row(self):
+        task, = self.create_tasks(1)
+        first, second = Task.objects.get(pk=task.pk), Task.objects.get(pk=task.pk)
+        move_task(first, 'doing')
+        move_task(second, 'complete')
+        self.assertEqual(TaskStat.objects.get(project=self.project).column, 'complete')
+        self.assertEqual(AssigneeStat.objects.get(project=self.project).column, 'complete')
+
+        operations, _ = parse_task_batch(self.project, [{'op': 'update', 'id': task.id, 'data': {'priority': 'high'}}])
+        move_task(Task.objects.get(pk=task.pk), 'todo')
+        apply_task_batch(self.project, self.owner, operations)
+        self.assertEqual(list(TaskStat.objects.values_list('column', 'priority', 'tasks')), [('todo', 'high', 1)])
+
+    def test_workspace_stats_skip_hidden_private_projects(self):
+        self.create_tasks(2)
+        secret = Project.objects.create(workspace=self.workspace, name='Secret', is_private=True)
+        Task.objects.create(project=secret, name='Hidden')
+        self.client.force_authenticate(self.member)
+        response = self.client.get(f'/api/workspace/{self.workspace.id}/stats/')
+        self.assertEqual(response.data['tasks'], 2)
+        self.assertEqual(response.data['projects'], {self.project.id: 2})
+
+
+class ProjectListTest(PrismTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/workspace/{self.workspace.id}/projects/'
+
+    def test_summaries_come_from_one_query(self):
+        self.create_tasks(3)
+        Task.objects.create(project=self.project, name='Done', column='complete')
+        ProjectMember.objects.create(project=self.project, member=self.member)
+        _, queries = self.count_queries('get', self.url)
+        for number in range(5):
+            Project.objects.create(workspace=self.workspace, name=f'Extra {number}')
+
+        response, more_queries = self.count_queries('get', self.url)
+        self.assertEqual(more_queries, queries)
+        self.assertEqual(len(response.data), 6)
+        summary = response.data[0]
+        self.assertEqual(summary['tasks'], {'todo': 3, 'doing': 0, 'complete': 1})
+        self.assertEqual(summary['member_count'], 1)
+        self.assertNotIn('task_set', summary)
+
+    def test_projects_are_listed_once_and_private_ones_only_to_members(self):
+        secret = Project.objects.create(workspace=self.workspace, name='Secret', is_private=True)
+        ProjectMember.objects.create(project=secret, member=self.owner)
+        for user in (self.owner, self.member, create_user('third')):
+            ProjectMember.objects.create(project=self.project, member=user)
+
+        self.assertEqual([project['id'] for project in self.client.get(self.url).data], [self.project.id, secret.id])
+        self.client.force_authenticate(self.member)
+        self.assertEqual([project['id'] for project in self.client.get(self.url).data], [self.project.id])
+
+    def test_full_form_on_request(self):
+        self.create_tasks(2)
+        response = self.client.get(self.url, {'expand': 'full'})
+        self.assertEqual(response.data[0]['task_set'], ['Task 0', 'Task 1'])
+
+    def test_private_projects_take_a_list_of_member_ids(self):
+        for members in ('12', 7, ['x'], {'id': 1}):
+            response = self.client.post(self.url, {'name': 'Secret', 'is_private': True, 'members': members},
+                                        format='json')
+            self.assertEqual(response.status_code, 400, members)
+        self.assertFalse(Project.objects.filter(name='Secret').exists())
+
+        response = self.client.post(self.url, {'name': 'Secret', 'is_private': True, 'members': [self.member.id]},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(ProjectMember.objects.filter(project__name='Secret').values_list('member_id', flat=True)),
+                         {self.owner.id, self.member.id})
+
+
+class WorkspaceOverviewTest(PrismTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/workspace/{self.workspace.id}/overview/'
+
+    def add_content(self, count):
+        for number in range(count):
+            Project.objects.create(workspace=self.workspace, name=f'Project {number}')
+            meeting = Meeting.objects.create(workspace=self.workspace, agenda=f'Meeting {number}',
+                                             link='https://meet.prism.test', start_time=timezone.now(),
+                                             duration_mins=30)
+            MeetingParticipant.objects.create(meeting=meeting, participant=self.member)
+            Update.objects.create(workspace=self.workspace, message=f'Update {number}')
+
+    def test_overview_takes_a_fixed_number_of_queries(self):
+        self.add_content(1)
+        _, queries = self.count_queries('get', self.url)
+        self.add_content(5)
+        response, more_queries = self.count_queries('get', self.url)
+        self.assertEqual(more_queries, queries)
+        self.assertEqual(response.data['role'], 'owner')
+        self.assertEqual(response.data['workspace']['name'], 'Prism')
+        self.assertEqual(len(response.data['projects']), 7)
+        self.assertEqual(len(response.data['meetings']), 6)
+        self.assertEqual(response.data['updates'][0]['message'], 'Update 4')
+
+    def test_sections_can_be_selected(self):
+        self.client.force_authenticate(self.member)
+        response = self.client.get(f'{self.url}?sections=role,projects')
+        self.assertEqual(set(response.data), {'role', 'projects'})
+        self.assertEqual(response.data['role'], 'member')
+        self.assertEqual(self.client.get(f'{self.url}?sections=role,tasks').status_code, 400)
+
+        self.client.force_authenticate(create_user('outsider'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class WorkspaceDirectoryTest(PrismTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = f'/api/workspace/{self.workspace.id}/directory/'
+
+    def test_directory_is_served_from_cache_until_members_change(self):
+        response, _ = self.count_queries('get', self.url)
+        self.assertEqual(response.json(), [
+            {'id': self.member.id, 'user_name': 'member', 'name': 'Member Tester', 'role': 'member'},
+            {'id': self.owner.id, 'user_name': 'owner', 'name': 'Owner Tester', 'role': 'admin'},
+        ])
+        # Only the membership check is left
+        cached, queries = self.count_queries('get', self.url)
+        self.assertEqual(queries, 1)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.first_name = 'Renamed'
+            self.member.save()
+        self.assertEqual(self.client.get(self.url).json()[0]['name'], 'Renamed Tester')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TeamMember.objects.create(workspace=self.workspace, member=create_user('another'), role='member')
+        self.assertEqual([row['user_name'] for row in self.client.get(self.url).json()], ['another', 'member', 'owner'])
+
+    def test_blobs_built_before_a_change_are_not_served_after_it(self):
+        version = directory_version(self.workspace.id)
+        stale = build_directory(self.workspace.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            TeamMember.objects.create(workspace=self.workspace, member=create_user('another'), role='member')
+        # A reader that read the members before the change stores its blob late
+        cache.set(directory_cache_key(self.workspace.id, version), stale)
+        self.assertEqual(len(self.client.get(self.url).json()), 3)
+
+    def test_directory_requires_membership(self):
+        self.client.force_authenticate(create_user('outsider'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class WorkspaceImageUploadTest(PrismTestCase):
+    url = '/api/workspace/upload/'
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def png(self, size=(800, 600)):
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 40, 40, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile('Logo.PNG', buffer.getvalue(), content_type='image/png')
+
+    def stored_files(self):
+        return sorted(name for _, _, names in os.walk(self.media_root) for name in names)
+
+    def test_identical_uploads_share_one_content_addressed_file(self):
+        response = self.client.post(self.url, {'image': self.png()}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        digest = response.data['digest']
+        self.assertEqual(response.data['image'], f'/uploads/workspaces/{digest[:2]}/{digest}.png')
+        self.assertEqual(response.data['status'], 'pending')
+
+        again = self.client.post(self.url, {'image': self.png()}, format='multipart')
+        self.assertEqual(again.data['id'], response.data['id'])
+        self.assertEqual(WorkspaceImage.objects.count(), 1)
+        self.assertEqual(self.stored_files(), [f'{digest}.png'])
+
+    def test_variants_are_made_off_request(self):
+        self.client.post(self.url, {'image': self.png()}, format='multipart')
+        self.assertEqual(process_pending_images(), 1)
+        self.assertEqual(process_pending_images(), 0)
+
+        image = WorkspaceImage.objects.get()
+        self.assertEqual(image.status, 'ready')
+        sizes = {}
+        for name, path in image.variants.items():
+            with Image.open(os.path.join(self.media_root, path)) as variant:
+                sizes[name] = (variant.format, variant.size)
+        self.assertEqual(sizes, {
+            'thumbnail': ('JPEG', (320, 240)),
+            'avatar': ('WEBP', (128, 128)),
+            'webp': ('WEBP', (800, 600)),
+        })
+
+    def test_images_over_the_pixel_limit_fail(self):
+        self.client.post(self.url, {'image': self.png()}, format='multipart')
+        with override_settings(IMAGE_MAX_PIXELS=800 * 600 - 1):
+            self.assertEqual(process_pending_images(), 1)
+        image = WorkspaceImage.objects.get()
+        self.assertEqual((image.status, image.variants), ('failed', {}))
+
+    def test_any_processing_error_fails_only_its_image(self):
+        self.client.post(self.url, {'image': self.png()}, format='multipart')
+        self.client.post(self.url, {'image': self.png((400, 300))}, format='multipart')
+        with mock.patch('core.images.render_variant', side_effect=[RuntimeError] + [ContentFile(b'')] * 3):
+            self.assertEqual(process_pending_images(), 2)
+        self.assertEqual(list(WorkspaceImage.objects.order_by('id').values_list('status', flat=True)),
+                         ['failed', 'ready'])
+
+    @override_settings(IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_oversized_uploads_are_refused(self):
+        response = self.client.post(self.url, {'image': self.png((2000, 2000))}, format='multipart')
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(WorkspaceImage.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+
+class MediaServingTest(TestCase):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.digest = 'ab' * 32
+        self.path = f'workspaces/ab/{self.digest}.png'
+        os.makedirs(os.path.join(media.name, 'workspaces', 'ab'))
+        with open(os.path.join(media.name, self.path), 'wb') as file:
+            file.write(b'0123456789')
+        with open(os.path.join(media.name, 'workspaces', 'legacy.png'), 'wb') as file:
+            file.write(b'legacy')
+
+    def test_content_addressed_files_are_immutable(self):
+        response = self.client.get(f'/uploads/{self.path}')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['ETag'], f'"{self.digest}.png"')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.client.get(f'/uploads/{self.path}', HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                         304)
+
+        legacy = self.client.get('/uploads/workspaces/legacy.png')
+        self.assertEqual(legacy['Cache-Control'], 'public, no-cache')
+        self.assertTrue(legacy['ETag'].startswith('W/'))
+
+    def test_range_requests(self):
+        response = self.client.get(f'/uploads/{self.path}', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        response = self.client.get(f'/uploads/{self.path}', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.client.get(f'/uploads/{self.path}', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+        # A stale If-Range gets the whole file
+        response = self.client.get(f'/uploads/{self.path}', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f'/uploads/{self.path}', HTTP_RANGE='bytes=2-5',
+                                   HTTP_IF_RANGE=f'"{self.digest}.png"')
+        self.assertEqual(response.status_code, 206)
+
+    def test_weak_etags_never_satisfy_if_range(self):
+        etag = self.client.get('/uploads/workspaces/legacy.png')['ETag']
+        response = self.client.get('/uploads/workspaces/legacy.png', HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'legacy')
+
+    def test_missing_and_outside_files_are_not_found(self):
+        self.assertEqual(self.client.get('/uploads/workspaces/missing.png').status_code, 404)
+        self.assertEqual(self.client.get('/uploads/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/uploads/workspaces/').status_code, 404)
+
+    @override_settings(MEDIA_SERVER='x-accel-redirect')
+    def test_transfer_can_be_handed_to_nginx(self):
+        response = self.client.get(f'/uploads/{self.path}')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-uploads/{self.path}')
+        self.assertEqual(response.content, b'')
+
+        with open(os.path.join(settings.MEDIA_ROOT, 'workspaces', 'logo café #1.png'), 'wb') as file:
+            file.write(b'logo')
+        response = self.client.get('/uploads/workspaces/logo%20caf%C3%A9%20%231.png')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-uploads/workspaces/logo%20caf%C3%A9%20%231.png')
+
+
+class ProjectMemberBulkTest(PrismTestCase):
+
+    def bulk(self, data):
+        return self.client.post(self.project_url('members/bulk/'), data, format='json')
+
+    def members(self):
+        return set(ProjectMember.objects.filter(project=self.project).values_list('member_id', flat=True))
+
+    def test_members_are_added_and_removed_together(self):
+        ProjectMember.objects.create(project=self.project, member=self.owner)
+        response = self.bulk({'add': [self.member.id], 'remove': [self.owner.id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'added': [self.member.id], 'removed': [self.owner.id], 'rejected': []})
+        self.assertEqual(self.members(), {self.member.id})
+
+    def test_duplicates_and_existing_members_are_added_once(self):
+        ProjectMember.objects.create(project=self.project, member=self.owner)
+        response = self.bulk({'add': [self.member.id, self.member.id, str(self.member.id), self.owner.id]})
+        self.assertEqual(response.data['added'], [self.member.id])
+        self.assertEqual(response.data['rejected'], [])
+        self.assertEqual(self.members(), {self.owner.id, self.member.id})
+
+    def test_non_members_and_invalid_ids_are_rejected(self):
+        outsider = create_user('outsider')
+        response = self.bulk({'add': [outsider.id, 'abc'], 'remove': [self.member.id, 'xyz']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'added': [], 'removed': [], 'rejected': ['abc', outsider.id, 'xyz']})
+        self.assertEqual(self.members(), set())
+
+    def test_lists_and_admin_rights_are_required(self):
+        self.assertEqual(self.bulk({'add': self.member.id}).status_code, 400)
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.bulk({'add': [self.member.id]}).status_code, 403)
+        self.assertEqual(self.members(), set())
+
+
+class MeetingParticipantsTest(PrismTestCase):
+
+    def create_meeting(self, participants):
+        return self.count_queries('post', f'/api/workspace/{self.workspace.id}/meetings/', {
+            'agenda': 'Planning',
+            'link': 'https://meet.prism.test/planning',
+            'start_time': '2021-08-01T10:00:00Z',
+            'duration_mins': 30,
+            'participants': participants,
+        })
+
+    def test_participants_are_inserted_in_bulk(self):
+        response, few_queries = self.create_meeting([self.owner.id])
+        self.assertEqual(response.status_code, 201)
+
+        members = [create_user(f'invitee{number}') for number in range(5)]
+        TeamMember.objects.bulk_create([TeamMember(workspace=self.workspace, member=user) for user in members])
+        response, many_queries = self.create_meeting([self.owner.id] + [user.id for user in members])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['meetingparticipant_set']), 6)
+        self.assertEqual(few_queries, many_queries)
+
+    def test_invalid_ids_and_non_members_are_rejected(self):
+        outsider = create_user('outsider')
+        response, _ = self.create_meeting([self.member.id, 'abc', outsider.id, self.member.id, None])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['rejected_participants'], ['abc', None, outsider.id])
+        self.assertEqual([participant['participant']['id'] for participant in response.data['meetingparticipant_set']],
+                         [self.member.id])
+
+    def test_participants_must_be_a_list(self):
+        for participants in (self.member.id, {'id': self.member.id}, 'abc'):
+            with self.subTest(participants=participants):
+                response, _ = self.create_meeting(participants)
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Meeting.objects.exists())
+
+
+class QueryPlanTest(PrismTestCase):
+    """
+    The hot lookups of the views have to be answered from an index, whatever the size of the tables.
+    """
+
+    def assertUsesIndex(self, queryset, *columns, ordered=False):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Tiny test tables are cheaper to scan, only whether an index can serve the query matters here
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan)
+            self.assertIn('Index', plan)
+            if ordered:
+                self.assertNotIn('Sort', plan)
+            return
+
+        plan = queryset.explain()
+        search = re.search(r'SEARCH \S+ USING (?:COVERING )?INDEX \S+ \((.*)\)', plan)
+        self.assertIsNotNone(search, plan)
+        for column in columns:
+            self.assertRegex(search.group(1), rf'\b{column}[=<>]', plan)
+        if ordered:
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_workspace_role_lookup(self):
+        queryset = TeamMember.objects.filter(member=self.member, workspace=self.workspace).values_list('role')
+        self.assertUsesIndex(queryset, 'member_id', 'workspace_id')
+
+    def test_project_membership_lookup(self):
+        queryset = ProjectMember.objects.filter(project=self.project, member=self.member)
+        self.assertUsesIndex(queryset, 'project_id', 'member_id')
+
+    def test_board_column_ordering(self):
+        queryset = Task.objects.filter(project=self.project, column='todo').order_by('index')
+        self.assertUsesIndex(queryset, 'project_id', 'column', ordered=True)
+
+    def test_meeting_participant_lookup(self):
+        queryset = MeetingParticipant.objects.filter(meeting_id=1, participant=self.member)
+        self.assertUsesIndex(queryset, 'meeting_id', 'participant_id')
+
+    def test_task_assignee_lookup(self):
+        queryset = TaskMember.objects.filter(task_id=1, member=self.member)
+        self.assertUsesIndex(queryset, 'task_id', 'member_id')
+
+    def test_task_dependency_lookup(self):
+        queryset = TaskDependency.objects.filter(task_id=1, dependency_id=2)
+        self.assertUsesIndex(queryset, 'task_id', 'dependency_id')
+
+    def test_updates_feed_page(self):
+        queryset = Update.objects.filter(workspace=self.workspace).order_by('-created', '-id')[:20]
+        self.assertUsesIndex(queryset, 'workspace_id', ordered=True)
+
+    def test_updates_feed_page_after_a_cursor(self):
+        queryset = seek_after(Update.objects.filter(workspace=self.workspace), timezone.now(), 100)
+        self.assertUsesIndex(queryset.order_by('-created', '-id')[:20], 'workspace_id', 'created', ordered=True)
+
+    def test_blocking_tasks_lookup(self):
+        self.assertUsesIndex(TaskClosure.objects.filter(downstream_id=1), 'downstream_id')
+
+    def test_user_search_prefix_lookup(self):
+        self.assertUsesIndex(UserSearchTerm.objects.filter(term__gte='ann', term__lt='ano'), 'term')
+
+
+class RecordingReplicaRouter(ReplicaRouter):
+    """
+    Records where reads are routed but serves them from the default database: a test mirror cannot see the data of
+    the test transaction.
+    """
+
+    def __init__(self):
+        super().__init__(replicas=['replica1'])
+        self.reads = []
+
+    def db_for_read(self, model, **hints):
+        self.reads.append(super().db_for_read(model, **hints))
+        return 'default'
+
+
+class ReplicaRoutingTest(PrismTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.router = RecordingReplicaRouter()
+        routing = override_settings(DATABASE_ROUTERS=[self.router],
+                                    MIDDLEWARE=settings.MIDDLEWARE + ['prism.routers.ReplicaPinningMiddleware'])
+        routing.enable()
+        self.addCleanup(routing.disable)
+
+    def reads_of(self, method, url, data=None):
+        self.router.reads = []
+        getattr(self.client, method)(url, data, format='json')
+        return set(self.router.reads)
+
+    def test_safe_reads_go_to_replicas_until_the_user_writes(self):
+        self.create_tasks(2)
+        self.assertEqual(self.reads_of('get', self.project_url('tasks/')), {'replica1'})
+        self.assertEqual(self.reads_of('get', f'/api/workspace/{self.workspace.id}/updates/'), {'replica1'})
+
+        self.assertEqual(self.reads_of('post', self.project_url('tasks/'), {'name': 'Fresh'}), {'default'})
+        self.assertEqual(self.reads_of('get', self.project_url('tasks/')), {'default'})
+
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.reads_of('get', self.project_url('tasks/')), {'replica1'})
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.router.db_for_read(Task)
+        self.assertEqual(self.router.reads, ['default'])
+
+
+class ReplicaSessionTest(TransactionTestCase):
+    """
+    Session authenticated requests with a real replica alias, connected to the test database like a test mirror.
+    """
+
+    def setUp(self):
+        cache.clear()
+        connections.databases['replica1'] = dict(connections['default'].settings_dict)
+        self.addCleanup(self.remove_replica)
+        routing = override_settings(DATABASE_ROUTERS=[ReplicaRouter(replicas=['replica1'])],
+                                    MIDDLEWARE=settings.MIDDLEWARE + ['prism.routers.ReplicaPinningMiddleware'])
+        routing.enable()
+        self.addCleanup(routing.disable)
+
+        self.staff = PrismUser.objects.create_superuser('staff@prism.test', 'staff', 'Staff', 'Tester', 'password123')
+        Workspace.objects.create(name='Prism', owner=self.staff)
+        self.client.force_login(self.staff)
+
+    def remove_replica(self):
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.databases['replica1']
+
+    def test_session_users_read_from_the_replica(self):
+        for url in ('/admin/', '/api/workspace/'):
+            with self.subTest(url=url), CaptureQueriesContext(connections['replica1']) as replica:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(replica.captured_queries)
+                # The session and the user are read from the primary
+                self.assertFalse(any('django_session' in query['sql'] for query in replica.captured_queries))
+
+
+class WorkspaceEventStreamTest(TransactionTestCase):
+
+    def setUp(self):
+        self.owner = create_user('owner')
+        self.outsider = create_user('outsider')
+        self.workspace = Workspace.objects.create(name='Prism', owner=self.owner)
+        TeamMember.objects.create(workspace=self.workspace, member=self.owner, role='admin')
+        TeamMember.objects.create(workspace=self.workspace, member=self.outsider, role='member')
+        self.project = Project.objects.create(workspace=self.workspace, name='Board')
+        self.private_project = Project.objects.create(workspace=self.workspace, name='Secret', is_private=True)
+        ProjectMember.objects.create(project=self.private_project, member=self.owner)
+
+    def open_stream(self, user, header_type=None):
+        token = str(AccessToken.for_user(user))
+        return ApplicationCommunicator(application, {
+            'type': 'http',
+            'method': 'GET',
+            'path': f'/api/workspace/{self.workspace.id}/events/',
+            'query_string': b'' if header_type else f'token={token}'.encode(),
+            'headers': [(b'authorization', f'{header_type} {token}'.encode())] if header_type else [],
+        })
+
+    async def connect(self, stream):
+        await stream.send_input({'type': 'http.request'})
+        self.assertEqual((await stream.receive_output(timeout=2))['status'], 200)
+        self.assertEqual(await self.read_event(stream), ': connected\n\n')
+
+    async def read_event(self, stream):
+        message = await stream.receive_output(timeout=2)
+        return message['body'].decode()
+
+    @async_to_sync
+    async def test_stream_pushes_updates_and_visible_task_changes(self):
+        stream = self.open_stream(self.outsider)
+        await self.connect(stream)
+
+        await sync_to_async(Update.objects.create)(workspace=self.workspace, message='Hello')
+        self.assertIn('event: update', await self.read_event(stream))
+
+        await sync_to_async(Task.objects.create)(project=self.private_project, name='Hidden')
+        await sync_to_async(Task.objects.create)(project=self.project, name='Visible')
+        event = await self.read_event(stream)
+        self.assertIn('event: task', event)
+        self.assertIn('"name": "Visible"', event)
+
+        await stream.send_input({'type': 'http.disconnect'})
+        self.assertEqual((await stream.receive_output(timeout=2))['body'], b'')
+        await stream.wait(timeout=2)
+
+    @async_to_sync
+    async def test_stream_requires_a_valid_token(self):
+        stream = ApplicationCommunicator(application, {
+            'type': 'http', 'method': 'GET', 'path': f'/api/workspace/{self.workspace.id}/events/',
+            'query_string': b'token=invalid', 'headers': [],
+        })
+        await stream.send_input({'type': 'http.request'})
+        self.assertEqual((await stream.receive_output(timeout=2))['status'], 401)
+
+    @async_to_sync
+    async def test_authorization_header_uses_the_configured_type(self):
+        stream = self.open_stream(self.owner, header_type='JWT')
+        await self.connect(stream)
+        await stream.send_input({'type': 'http.disconnect'})
+        await stream.receive_output(timeout=2)
+        await stream.wait(timeout=2)
+
+        stream = self.open_stream(self.owner, header_type='Bearer')
+        await stream.send_input({'type': 'http.request'})
+        self.assertEqual((await stream.receive_output(timeout=2))['status'], 401)
+
+    @async_to_sync
+    async def test_stream_ends_when_the_member_leaves(self):
+        stream = self.open_stream(self.outsider)
+        await self.connect(stream)
+        await sync_to_async(TeamMember.objects.filter(member=self.outsider).delete)()
+        self.assertEqual((await stream.receive_output(timeout=2))['body'], b'')
+        await stream.wait(timeout=2)
+
+    @async_to_sync
+    async def test_project_visibility_follows_membership_changes(self):
+        stream = self.open_stream(self.outsider)
+        await self.connect(stream)
+        await sync_to_async(Task.objects.create)(project=self.private_project, name='Hidden')
+        await sync_to_async(ProjectMember.objects.create)(project=self.private_project, member=self.outsider)
+        await sync_to_async(Task.objects.create)(project=self.private_project, name='Shared')
+        event = await self.read_event(stream)
+        self.assertIn('"name": "Shared"', event)
+
+        await stream.send_input({'type': 'http.disconnect'})
+        await stream.receive_output(timeout=2)
+        await stream.wait(timeout=2)
+
+
+class RecordingSMTPHandler:
+    def __init__(self):
+        self.envelopes = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        return '250 OK'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class QueuedEmailTest(PrismTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.handler = RecordingSMTPHandler()
+        self.port = free_port()
+        self.smtp_settings = override_settings(EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.port, EMAIL_USE_TLS=False,
+                                               EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+                                               DEFAULT_FROM_EMAIL='noreply@prism.test')
+        self.smtp_settings.enable()
+        self.addCleanup(self.smtp_settings.disable)
+
+    def create_meeting(self):
+        return self.client.post(f'/api/workspace/{self.workspace.id}/meetings/', {
+            'agenda': 'Planning',
+            'link': 'https://meet.prism.test/planning',
+            'start_time': '2021-08-01T10:00:00Z',
+            'duration_mins': 30,
+            'participants': [self.owner.id, self.member.id],
+        }, format='json')
+
+    @skipIf(Controller is None, 'aiosmtpd is not installed')
+    def test_meeting_invitation_is_queued_and_delivered_by_worker(self):
+        response = self.create_meeting()
+        self.assertEqual(response.status_code, 201)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, 'pending')
+        self.assertCountEqual(email.recipients, [self.owner.email, self.member.email])
+
+        controller = Controller(self.handler, hostname='127.0.0.1', port=self.port)
+        controller.start()
+        self.addCleanup(controller.stop)
+        self.assertEqual(deliver_queued_emails(), 1)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'sent')
+        self.assertEqual(len(self.handler.envelopes), 1)
+        self.assertCountEqual(self.handler.envelopes[0].rcpt_tos, [self.owner.email, self.member.email])
+        self.assertEqual(self.handler.envelopes[0].mail_from, 'noreply@prism.test')
+
+    def test_failed_delivery_is_retried_later(self):
+        # Nothing listens on the port
+        self.create_meeting()
+        self.assertEqual(deliver_queued_emails(max_attempts=2), 0)
+
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.assertGreater(email.next_attempt, timezone.now())
+        self.assertEqual(deliver_queued_emails(max_attempts=2), 0)
@@ -10,7 +10,10 @@ urlpatterns = [
     path("upload/", WorkspaceImageUpload.as_view(), name="workspace-image-upload"),
     path("<int:pk>/role/", WorkspaceRole.as_view(), name="workspace-role"),
     path("<int:pk>/team/", TeamMemberListCreate.as_view(), name="teammember-list-create"),
+    path("<int:pk>/directory/", WorkspaceDirectory.as_view(), name="workspace-directory"),
+    path("<int:pk>/overview/", WorkspaceOverview.as_view(), name="workspace-overview"),
     path("<int:pk>/updates/", UpdateList.as_view(), name="update-list"),
+    path("<int:pk>/stats/", WorkspaceStats.as_view(), name="workspace-stats"),
     path("<int:workspace_id>/team/<int:pk>/", TeamMemberRetrieveUpdateDelete.as_view(), name="teammember-detail"),
     path("<int:pk>/meetings/", MeetingListCreate.as_view(), name="meeting-list-create"),
     path("<int:workspace_id>/meetings/<int:pk>/", MeetingRetrieveUpdateDelete.as_view(), name="meeting-detail"),
@@ -22,22 +25,34 @@ urlpatterns = [
     path("<int:workspace_id>/projects/<int:pk>/", ProjectRetrieveUpdateDelete.as_view(), name="project-detail"),
     path("<int:workspace_id>/projects/<int:project_id>/members/", ProjectMemberListCreate.as_view(),
          name="project-member-list-create"),
+    path("<int:workspace_id>/projects/<int:project_id>/members/bulk/", ProjectMemberBulk.as_view(),
+         name="project-member-bulk"),
     path("<int:workspace_id>/projects/<int:project_id>/members/<int:pk>/", ProjectMemberDestroy.as_view(),
          name="project-member-destroy"),
     path("<int:workspace_id>/projects/<int:project_id>/tasks/", TaskListCreate.as_view(),
          name="task-list-create"),
+    path("<int:workspace_id>/projects/<int:project_id>/tasks/batch/", TaskBatch.as_view(), name="task-batch"),
+    path("<int:workspace_id>/projects/<int:project_id>/board/", ProjectBoard.as_view(), name="project-board"),
+    path("<int:workspace_id>/projects/<int:project_id>/stats/", ProjectStats.as_view(), name="project-stats"),
+    path("<int:workspace_id>/projects/<int:project_id>/schedule/", ProjectSchedule.as_view(), name="project-schedule"),
     path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:pk>/", TaskRetrieveUpdateDelete.as_view(),
          name="task-detail"),
+    path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:pk>/move/", TaskMove.as_view(),
+         name="task-move"),
     path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:task_id>/members/", TaskMemberListCreate.as_view(),
          name="task-member-list-create"),
     path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:task_id>/members/<int:pk>/",
          TaskMemberDestroy.as_view(), name="task-member-delete"),
     path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:task_id>/dependency/",
          TaskDependencyListCreate.as_view(), name="task-dependency-list-create"),
+    path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:task_id>/blocking/", TaskBlocking.as_view(),
+         name="task-blocking"),
     path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:task_id>/dependency/<int:pk>/",
          TaskDependencyDestroy.as_view(), name="task-dependency-delete"),
     path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:task_id>/subtasks/",
          SubTaskListCreate.as_view(), name="subtask-list-create"),
+    path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:task_id>/subtasks/bulk/",
+         SubTaskBulk.as_view(), name="subtask-bulk"),
     path("<int:workspace_id>/projects/<int:project_id>/tasks/<int:task_id>/subtasks/<int:pk>/",
          SubTaskRetrieveUpdateDestroy.as_view(), name="subtask-detail"),
 ]
@@ -1,25 +1,180 @@
 import smtplib
+from datetime import timedelta
 from email.message import EmailMessage
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Exists, OuterRef, Subquery, Count, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 
+from core.models import Workspace, TeamMember, Project, ProjectMember, OutgoingEmail, Task, SubTask
+from core.broker import publish_access_change
+from core.permissions import invalidate_project_membership
 
-def send_email(subject, message, recipients):
-    with smtplib.SMTP('smtp.gmail.com', 587) as smtp:
+
+def build_email(subject, message, recipients):
+    mail = EmailMessage()
+    mail['From'] = settings.DEFAULT_FROM_EMAIL
+    mail['To'] = ', '.join(recipients)
+    mail['Subject'] = subject
+    mail.set_content(subject + "\n" + message)
+    mail.add_alternative("""\
+        <!DOCTYPE html>
+        <html lang="en">
+        <body style="background-color: #ffffff;">
+        """ + message + """
+        </body>
+        </html>
+        """, subtype='html')
+    return mail
+
+
+def smtp_connection():
+    smtp = smtplib.SMTP(settings.EMAIL_HOST, settings.EMAIL_PORT, timeout=settings.EMAIL_TIMEOUT)
+    if settings.EMAIL_USE_TLS:
         smtp.ehlo()
         smtp.starttls()
         smtp.ehlo()
+    if settings.EMAIL_HOST_USER and settings.EMAIL_HOST_PASSWORD:
         smtp.login(settings.EMAIL_HOST_USER, settings.EMAIL_HOST_PASSWORD)
-        mail = EmailMessage()
-        mail['From'] = settings.EMAIL_HOST_USER
-        mail['To'] = recipients
-        mail['Subject'] = subject
-        mail.set_content(subject + "\n" + message)
-        mail.add_alternative("""\
-            <!DOCTYPE html>
-            <html lang="en">
-            <body style="background-color: #ffffff;">
-            """ + message + """
-            </body>
-            </html>
-            """, subtype='html')
-        smtp.send_message(mail)
+    return smtp
+
+
+def queue_email(subject, message, recipients):
+    if recipients:
+        OutgoingEmail.objects.create(subject=subject, message=message, recipients=list(recipients))
+
+
+def claim_queued_emails(batch_size):
+    """
+    Leases a batch of due emails to the calling worker, so that concurrent workers never send the same email twice.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutgoingEmail.objects.select_for_update(skip_locked=True) \
+            .filter(status='pending', next_attempt__lte=now).order_by('next_attempt', 'id')[:batch_size]
+        emails = list(due)
+        OutgoingEmail.objects.filter(id__in=[email.id for email in emails]) \
+            .update(next_attempt=now + timedelta(seconds=settings.EMAIL_LEASE_SECONDS))
+    return emails
+
+
+def deliver_queued_emails(batch_size=50, max_attempts=5):
+    """
+    Sends one batch of queued emails over a single SMTP connection. Returns the number of emails sent.
+    """
+    emails = claim_queued_emails(batch_size)
+    if not emails:
+        return 0
+
+    sent = 0
+    smtp = None
+    for email in emails:
+        try:
+            if smtp is None:
+                smtp = smtp_connection()
+            smtp.send_message(build_email(email.subject, email.message, email.recipients))
+        except (smtplib.SMTPException, OSError) as error:
+            if isinstance(error, smtplib.SMTPServerDisconnected):
+                smtp = None
+            email.attempts += 1
+            email.last_error = str(error)
+            if email.attempts >= max_attempts:
+                email.status = 'failed'
+            # Exponential backoff: 1, 2, 4, ... minutes
+            email.next_attempt = timezone.now() + timedelta(minutes=2 ** (email.attempts - 1))
+            email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt'])
+        else:
+            email.status = 'sent'
+            email.sent = timezone.now()
+            email.save(update_fields=['status', 'sent'])
+            sent += 1
+
+    if smtp is not None:
+        try:
+            smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+    return sent
+
+
+def split_ids(values):
+    """
+    Splits client supplied ids into unique integer ids and the values that are not valid ids.
+    """
+    ids, invalid = [], []
+    for value in values:
+        try:
+            value_id = int(value)
+        except (TypeError, ValueError):
+            invalid.append(value)
+            continue
+        if value_id not in ids:
+            ids.append(value_id)
+    return ids, invalid
+
+
+def touch_workspace(**lookup):
+    Workspace.objects.filter(**lookup).update(version=F('version') + 1, modified=timezone.now())
+
+
+def touch_project(**lookup):
+    Project.objects.filter(**lookup).update(version=F('version') + 1, modified=timezone.now())
+
+
+def refresh_subtask_progress(task_ids):
+    """
+    Recounts the done/total subtasks of the given tasks in a single UPDATE.
+    """
+    subtasks = SubTask.objects.filter(task=OuterRef('pk')).order_by().values('task')
+    total = subtasks.annotate(count=Count('id')).values('count')
+    done = subtasks.filter(status=True).annotate(count=Count('id')).values('count')
+    Task.objects.filter(pk__in=task_ids).update(
+        subtasks_total=Coalesce(Subquery(total), Value(0)),
+        subtasks_done=Coalesce(Subquery(done), Value(0)),
+    )
+
+
+def conditional_response(request, tag, build_response):
+    """
+    Answers with 304 when the client already holds `tag`, otherwise with build_response().
+    No Last-Modified is sent: whole second dates would miss writes made in the same second, so clients revalidate
+    with If-None-Match.
+    """
+    etag = f'"{tag}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build_response()
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def add_project_members(project, user_ids):
+    """
+    Adds the workspace members among user_ids to the project. Returns the added ids and the rejected values.
+    """
+    ids, rejected = split_ids(user_ids)
+    candidates = dict(
+        TeamMember.objects.filter(workspace_id=project.workspace_id, member_id__in=ids)
+        .annotate(in_project=Exists(ProjectMember.objects.filter(project=project, member_id=OuterRef('member_id'))))
+        .values_list('member_id', 'in_project')
+    )
+    rejected += [user_id for user_id in ids if user_id not in candidates]
+    added = [user_id for user_id in ids if user_id in candidates and not candidates[user_id]]
+    # A concurrent add of the same member is left to the unique constraint
+    ProjectMember.objects.bulk_create([ProjectMember(project=project, member_id=user_id) for user_id in added],
+                                      ignore_conflicts=True)
+    invalidate_project_membership(added, project.id)
+    if added:
+        publish_access_change(project.workspace_id, added)
+    return added, rejected
+
+
+def remove_project_members(project, user_ids):
+    ids, rejected = split_ids(user_ids)
+    project_members = ProjectMember.objects.filter(project=project, member_id__in=ids)
+    removed = list(project_members.values_list('member_id', flat=True))
+    project_members.delete()
+    return removed, rejected
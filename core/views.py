@@ -2,12 +2,28 @@ from rest_framework import generics, status
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from datetime import datetime, time
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework.views import APIView
 
+from core.batch import parse_task_batch, apply_task_batch, BATCH_MAX_OPERATIONS
+from core.board import build_board
+from core.broker import publish_event
+from core.directory import workspace_directory
+from core.graph import DependencyGraph, DependencyCycle
+from core.images import ImageUploadHandler
+from core.ordering import next_index, move_task
+from core.pagination import CreatedCursorPagination
+from core.permissions import *
 from core.serializers import *
-from core.utils import send_email
+from core.stats import summarise_task_stats, with_project_counts
+from core.utils import queue_email, conditional_response, split_ids, touch_workspace, touch_project, \
+    add_project_members, remove_project_members, refresh_subtask_progress
 
 
 class WorkspaceListCreate(generics.ListCreateAPIView):
@@ -52,13 +68,10 @@ class WorkspaceRole(generics.RetrieveAPIView):
     def retrieve(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
         workspace = get_object_or_404(Workspace, pk=pk)
-        if request.user == workspace.owner:
+        if request.user.id == workspace.owner_id:
             return Response({'role': 'owner'}, status=status.HTTP_200_OK)
-        if TeamMember.objects.filter(member=request.user, workspace=workspace).exists():
-            member = TeamMember.objects.filter(member=request.user, workspace=workspace).first()
-            return Response({"role": member.role}, status=status.HTTP_200_OK)
-        else:
-            return Response({"role": None}, status=status.HTTP_200_OK)
+        access = resolve_access(request, workspace.id)
+        return Response({"role": access.role}, status=status.HTTP_200_OK)
 
 
 class WorkspaceRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
@@ -71,8 +84,8 @@ class WorkspaceRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
     def retrieve(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
         workspace = get_object_or_404(Workspace, pk=pk)
-        if not TeamMember.objects.filter(member=request.user, workspace=workspace).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
+        if not resolve_access(request, workspace.id).is_member:
+            return Response(WORKSPACE_MEMBERS_ONLY, status=status.HTTP_403_FORBIDDEN)
 
         serializer = WorkspaceSerializer(workspace)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -102,7 +115,8 @@ class WorkspaceRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
 
 class TeamMemberListCreate(generics.ListCreateAPIView):
     serializer_class = TeamMemberSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsWorkspaceAdminOrMemberReadOnly]
+    workspace_url_kwarg = 'pk'
 
     def get_queryset(self):
         return TeamMember.objects.all()
@@ -115,17 +129,17 @@ class TeamMemberListCreate(generics.ListCreateAPIView):
         assigned_role = request.data.get('role', 'member')
         if assigned_role == 'admin' and user != workspace.owner:
             return Response({'error': 'Access restricted to workspace owner only'}, status=status.HTTP_403_FORBIDDEN)
-        elif not TeamMember.objects.filter(member=user, workspace=workspace, role='admin').exists():
-            return Response({'error': 'Access restricted to workspace admins only'}, status=status.HTTP_403_FORBIDDEN)
         new_member = get_object_or_404(PrismUser, pk=new_member_id)
-        if TeamMember.objects.filter(member=new_member, workspace=workspace).exists():
-            return Response({'error': 'Member already exists in the workspace'}, status=status.HTTP_400_BAD_REQUEST)
 
         teammember = TeamMember()
         teammember.member = new_member
         teammember.workspace = workspace
         teammember.role = assigned_role
-        teammember.save()
+        try:
+            with transaction.atomic():
+                teammember.save()
+        except IntegrityError:
+            return Response({'error': 'Member already exists in the workspace'}, status=status.HTTP_400_BAD_REQUEST)
 
         update = Update()
         update.workspace = workspace
@@ -137,11 +151,7 @@ class TeamMemberListCreate(generics.ListCreateAPIView):
 
     def list(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
-        user = request.user
-        workspace = get_object_or_404(Workspace, pk=pk)
-        if not TeamMember.objects.filter(member=user, workspace=workspace).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-        team_queryset = TeamMember.objects.filter(workspace=workspace)
+        team_queryset = TeamMember.objects.filter(workspace_id=pk)
         serializer = TeamMemberSerializer(team_queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -157,8 +167,8 @@ class TeamMemberRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
         pk = kwargs.get('pk')
         workspace_id = kwargs.get('workspace_id')
         workspace = get_object_or_404(Workspace, pk=workspace_id)
-        if not TeamMember.objects.filter(member=request.user, workspace=workspace).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
+        if not resolve_access(request, workspace.id).is_member:
+            return Response(WORKSPACE_MEMBERS_ONLY, status=status.HTTP_403_FORBIDDEN)
         team_member = get_object_or_404(TeamMember, pk=pk)
         serializer = TeamMemberSerializer(team_member)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -198,25 +208,94 @@ class TeamMemberRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
 
 class UpdateList(generics.ListAPIView):
     serializer_class = UpdateSerializer
-    permission_classes = [IsAuthenticated]
+    pagination_class = CreatedCursorPagination
+    permission_classes = [IsAuthenticated, IsWorkspaceMember]
+    workspace_url_kwarg = 'pk'
 
     def get_queryset(self):
         return Update.objects.all()
 
     def list(self, request, **kwargs):
         pk = kwargs.get('pk')
-        user = self.request.user
         workspace = get_object_or_404(Workspace, pk=pk)
-        if not TeamMember.objects.filter(member=user, workspace=workspace).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-        update_queryset = Update.objects.filter(workspace=workspace).order_by('-created')[:20]
-        serializer = UpdateSerializer(update_queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+
+        def build_response():
+            page = self.paginate_queryset(Update.objects.filter(workspace=workspace))
+            serializer = UpdateSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        paginator = self.paginator
+        cursor = request.query_params.get(paginator.cursor_query_param, '')
+        tag = f'updates-{workspace.id}-{workspace.version}-{cursor}-{paginator.get_limit(request)}'
+        return conditional_response(request, tag, build_response)
+
+
+class WorkspaceOverview(APIView):
+    """
+    Everything a workspace page opens with, in one request: `?sections=` picks among role, workspace, projects,
+    meetings and updates (all by default). Membership is resolved once and every section is a fixed number of
+    queries; updates are the first page of UpdateList, with the cursor of the next one.
+    """
+    permission_classes = [IsAuthenticated, IsWorkspaceMember]
+    workspace_url_kwarg = 'pk'
+    sections = ('role', 'workspace', 'projects', 'meetings', 'updates')
+
+    def get(self, request, *args, **kwargs):
+        sections = request.query_params.get('sections')
+        sections = [section for section in sections.split(',') if section] if sections else self.sections
+        unknown = [section for section in sections if section not in self.sections]
+        if unknown:
+            return Response({'error': f'Unknown sections: {", ".join(unknown)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        workspace = get_object_or_404(Workspace.objects.select_related('owner'), pk=kwargs.get('pk'))
+        overview = {}
+        if 'role' in sections:
+            owner = request.user.id == workspace.owner_id
+            overview['role'] = 'owner' if owner else resolve_access(request, workspace.id).role
+        if 'workspace' in sections:
+            overview['workspace'] = WorkspaceSerializer(workspace).data
+        if 'projects' in sections:
+            projects = with_project_counts(visible_projects(request.user, workspace.id).order_by('id'))
+            overview['projects'] = ProjectSummarySerializer(projects, many=True).data
+        if 'meetings' in sections:
+            meetings = MeetingSerializer.setup_eager_loading(Meeting.objects.filter(workspace=workspace))
+            overview['meetings'] = MeetingSerializer(meetings, many=True).data
+        if 'updates' in sections:
+            paginator = CreatedCursorPagination()
+            page = paginator.paginate_queryset(Update.objects.filter(workspace=workspace), request, self)
+            overview['updates'] = UpdateSerializer(page, many=True).data
+            overview['updates_next_cursor'] = paginator.next_cursor
+        return Response(overview, status=status.HTTP_200_OK)
+
+
+class WorkspaceDirectory(APIView):
+    """
+    Compact member list for pickers: id, user_name, name and role of every member, served from the cache.
+    """
+    permission_classes = [IsAuthenticated, IsWorkspaceMember]
+    workspace_url_kwarg = 'pk'
+
+    def get(self, request, *args, **kwargs):
+        directory = workspace_directory(kwargs.get('pk'))
+        return conditional_response(request, directory['version'],
+                                    lambda: HttpResponse(directory['body'], content_type='application/json'))
+
+
+class WorkspaceStats(APIView):
+    permission_classes = [IsAuthenticated, IsWorkspaceMember]
+    workspace_url_kwarg = 'pk'
+
+    def get(self, request, *args, **kwargs):
+        projects = visible_projects(request.user, kwargs.get('pk')).values('id')
+        stats = summarise_task_stats(projects)
+        stats['workspace'] = kwargs.get('pk')
+        return Response(stats, status=status.HTTP_200_OK)
 
 
 class MeetingListCreate(generics.ListCreateAPIView):
     serializer_class = MeetingSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsWorkspaceAdminOrMemberReadOnly]
+    workspace_url_kwarg = 'pk'
 
     def get_queryset(self):
         return Meeting.objects.all()
@@ -226,8 +305,10 @@ class MeetingListCreate(generics.ListCreateAPIView):
         workspace = get_object_or_404(Workspace, pk=pk)
         request.data['workspace'] = pk
 
-        if not TeamMember.objects.filter(member=request.user, workspace=workspace, role='admin').exists():
-            return Response({'error': 'Access restricted to workspace admins only'}, status=status.HTTP_403_FORBIDDEN)
+        participants = request.data.get('participants', None)
+        if participants is not None and not isinstance(participants, list):
+            return Response({'error': 'participants must be a list of member ids'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
         serializer = MeetingSerializer(data=request.data)
         if serializer.is_valid():
@@ -241,23 +322,23 @@ class MeetingListCreate(generics.ListCreateAPIView):
 by {request.user.user_name}'
         update.save()
 
-        participants = request.data.get('participants', None)
+        rejected_participants = []
 
         if participants is not None:
-            email_list = []
-            for user_id in participants:
-                try:
-                    meeting_user = PrismUser.objects.get(pk=user_id)
-                    if TeamMember.objects.filter(member=meeting_user, workspace=workspace).exists():
-                        meetint_participant = MeetingParticipant()
-                        meetint_participant.participant = meeting_user
-                        meetint_participant.meeting = instance
-                        meetint_participant.save()
-                        email_list.append(meeting_user.email)
-                except PrismUser.DoesNotExist:
-                    print(f'{user_id} does not exist')
-
-            send_email(
+            participant_ids, rejected_participants = split_ids(participants)
+            # Only workspace members can be invited, validated for all participants at once
+            member_emails = dict(
+                TeamMember.objects.filter(workspace=workspace, member_id__in=participant_ids)
+                .values_list('member_id', 'member__email')
+            )
+            rejected_participants += [user_id for user_id in participant_ids if user_id not in member_emails]
+            MeetingParticipant.objects.bulk_create([
+                MeetingParticipant(meeting=instance, participant_id=user_id) for user_id in member_emails
+            ])
+            touch_workspace(pk=workspace.id)
+            email_list = list(member_emails.values())
+
+            queue_email(
                 recipients=email_list,
                 subject=f"Meeting - {instance.agenda}",
                 message="""
@@ -294,41 +375,38 @@ by {request.user.user_name}'
                 </table>"""
             )
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        meeting = MeetingSerializer.setup_eager_loading(Meeting.objects.filter(pk=instance.pk)).get()
+        response_data = dict(MeetingSerializer(meeting).data)
+        response_data['rejected_participants'] = rejected_participants
+        return Response(response_data, status=status.HTTP_201_CREATED)
 
     def list(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
-        user = request.user
         workspace = get_object_or_404(Workspace, pk=pk)
-        if not TeamMember.objects.filter(member=user, workspace=workspace).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-        meeting_queryset = Meeting.objects.filter(workspace=workspace)
-        serializer = MeetingSerializer(meeting_queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+
+        def build_response():
+            meeting_queryset = Meeting.objects.filter(workspace=workspace)
+            meeting_queryset = MeetingSerializer.setup_eager_loading(meeting_queryset)
+            serializer = MeetingSerializer(meeting_queryset, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        return conditional_response(request, f'meetings-{workspace.id}-{workspace.version}', build_response)
 
 
 class MeetingRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = MeetingSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsWorkspaceAdminOrMemberReadOnly]
 
     def get_queryset(self):
         return Meeting.objects.all()
 
     def retrieve(self, request, *args, **kwargs):
-        workspace_id = kwargs.get('workspace_id')
-        user = request.user
-        workspace = get_object_or_404(Workspace, pk=workspace_id)
-        if not TeamMember.objects.filter(member=user, workspace=workspace).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
         meeting = get_object_or_404(Meeting, pk=kwargs.get('pk'))
         serializer = MeetingSerializer(meeting)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def update(self, request, *args, **kwargs):
         workspace_id = kwargs.get('workspace_id')
-        workspace = get_object_or_404(Workspace, pk=workspace_id)
-        if not TeamMember.objects.filter(member=request.user, workspace=workspace, role='admin').exists():
-            return Response({'error': 'Access restricted to workspace admins only'}, status=status.HTTP_403_FORBIDDEN)
 
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
@@ -338,7 +416,7 @@ class MeetingRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
         self.perform_update(serializer)
 
         update = Update()
-        update.workspace = workspace
+        update.workspace_id = workspace_id
         update.message = f'Meeting {serializer.data["agenda"]} updated by {request.user.user_name}'
         update.save()
 
@@ -346,14 +424,11 @@ class MeetingRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
 
     def destroy(self, request, *args, **kwargs):
         workspace_id = kwargs.get('workspace_id')
-        workspace = get_object_or_404(Workspace, pk=workspace_id)
-        if not TeamMember.objects.filter(member=request.user, workspace=workspace, role='admin').exists():
-            return Response({'error': 'Access restricted to workspace admins only'}, status=status.HTTP_403_FORBIDDEN)
 
         instance = self.get_object()
 
         update = Update()
-        update.workspace = workspace
+        update.workspace_id = workspace_id
         update.message = f'Meeting {instance.agenda} deleted by {request.user.user_name}'
         update.save()
 
@@ -363,41 +438,35 @@ class MeetingRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
 
 class MeetingParticipantListCreate(generics.ListCreateAPIView):
     serializer_class = MeetingParticipantSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsWorkspaceAdminOrMemberReadOnly]
 
     def get_queryset(self):
         return MeetingParticipant.objects.all()
 
     def list(self, request, *args, **kwargs):
-        pk = kwargs.get('workspace_id')
-        workspace = get_object_or_404(Workspace, pk=pk)
-        if not TeamMember.objects.filter(member=request.user, workspace=workspace).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
         meeting_queryset = MeetingParticipant.objects.filter(meeting_id=kwargs.get('meeting_id'))
         serializer = MeetingParticipantSerializer(meeting_queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
         pk = kwargs.get('workspace_id')
-        workspace = get_object_or_404(Workspace, pk=pk)
-        if not TeamMember.objects.filter(member=request.user, workspace=workspace, role='admin').exists():
-            return Response({'error': 'Access restricted to workspace admins only'}, status=status.HTTP_403_FORBIDDEN)
 
         user_id = request.data.get('participant', None)
-        if user_id is None or not TeamMember.objects.filter(member_id=user_id, workspace=workspace).exists():
+        if user_id is None or not TeamMember.objects.filter(member_id=user_id, workspace_id=pk).exists():
             return Response({'error': 'Invalid participant id'}, status=status.HTTP_400_BAD_REQUEST)
 
         meeting_id = kwargs.get('meeting_id')
-        if MeetingParticipant.objects.filter(meeting_id=meeting_id, participant_id=user_id).exists():
-            return Response({'error': 'Already added to the meeting'}, status=status.HTTP_400_BAD_REQUEST)
-
         meeting = get_object_or_404(Meeting, pk=meeting_id)
         user = get_object_or_404(PrismUser, pk=user_id)
 
         meeting_participant = MeetingParticipant()
         meeting_participant.meeting = meeting
         meeting_participant.participant = user
-        meeting_participant.save()
+        try:
+            with transaction.atomic():
+                meeting_participant.save()
+        except IntegrityError:
+            return Response({'error': 'Already added to the meeting'}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = MeetingParticipantSerializer(meeting_participant)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -405,17 +474,12 @@ class MeetingParticipantListCreate(generics.ListCreateAPIView):
 
 class MeetingParticipantDestroy(generics.DestroyAPIView):
     serializer_class = MeetingParticipantSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsWorkspaceAdmin]
 
     def get_queryset(self):
         return MeetingParticipant.objects.all()
 
     def destroy(self, request, *args, **kwargs):
-        workspace_id = kwargs.get('workspace_id')
-        workspace = get_object_or_404(Workspace, pk=workspace_id)
-        if not TeamMember.objects.filter(member=request.user, workspace=workspace, role='admin').exists():
-            return Response({'error': 'Access restricted to workspace admins only'}, status=status.HTTP_403_FORBIDDEN)
-
         instance = self.get_object()
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -423,7 +487,8 @@ class MeetingParticipantDestroy(generics.DestroyAPIView):
 
 class ProjectListCreate(generics.ListCreateAPIView):
     serializer_class = ProjectSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsWorkspaceAdminOrMemberReadOnly]
+    workspace_url_kwarg = 'pk'
 
     def get_queryset(self):
         return Project.objects.all()
@@ -431,9 +496,10 @@ class ProjectListCreate(generics.ListCreateAPIView):
     def create(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
         workspace = get_object_or_404(Workspace, pk=pk)
+        members = request.data.get('members', None) or []
+        if not isinstance(members, list) or split_ids(members)[1]:
+            return Response({'error': 'members must be a list of member ids'}, status=status.HTTP_400_BAD_REQUEST)
         request.data['workspace'] = pk
-        if not TeamMember.objects.filter(member=request.user, workspace=workspace, role='admin').exists():
-            return Response({'error': 'Access restricted to workspace admins only'}, status=status.HTTP_403_FORBIDDEN)
 
         serializer = ProjectSerializer(data=request.data)
         if serializer.is_valid():
@@ -447,35 +513,18 @@ class ProjectListCreate(generics.ListCreateAPIView):
         update.save()
 
         if instance.is_private:
-            members = request.data.get('members', None)
-            if members is not None:
-                for user_id in members:
-                    try:
-                        project_member_user = PrismUser.objects.get(pk=user_id)
-                        if TeamMember.objects.filter(member=project_member_user, workspace=workspace).exists():
-                            project_member = ProjectMember()
-                            project_member.member = project_member_user
-                            project_member.project = instance
-                            project_member.save()
-                    except PrismUser.DoesNotExist:
-                        print(f'{user_id} does not exist')
-            if members is None or request.user.id not in members:
-                project_member = ProjectMember()
-                project_member.member = request.user
-                project_member.project = instance
-                project_member.save()
+            add_project_members(instance, members + [request.user.id])
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def list(self, request, *args, **kwargs):
-        pk = kwargs.get('pk')
-        user = request.user
-        workspace = get_object_or_404(Workspace, pk=pk)
-        if not TeamMember.objects.filter(member=user, workspace=workspace).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-        project_queryset = Project.objects.filter(workspace=workspace) \
-            .filter(Q(is_private=False) | Q(projectmember__member_id=user.id))
-        serializer = ProjectSerializer(project_queryset, many=True)
+        project_queryset = visible_projects(request.user, kwargs.get('pk')).order_by('id')
+        # Summaries by default, the tasks and members of every project only when asked for
+        if request.query_params.get('expand') == 'full':
+            project_queryset = project_queryset.prefetch_related('task_set', 'projectmember_set__member')
+            serializer = ProjectSerializer(project_queryset, many=True)
+        else:
+            serializer = ProjectSummarySerializer(with_project_counts(project_queryset), many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -489,20 +538,16 @@ class ProjectRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
     def retrieve(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
         project = get_object_or_404(Project, pk=pk)
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
+        if project.is_private and not resolve_access(request, project.workspace_id, project).project_member:
+            return Response(PROJECT_MEMBERS_ONLY, status=status.HTTP_403_FORBIDDEN)
         serializer = ProjectSerializer(project)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def update(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
         project = get_object_or_404(Project, pk=pk)
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
+        if project.is_private and not resolve_access(request, project.workspace_id, project).project_member:
+            return Response(PROJECT_MEMBERS_ONLY, status=status.HTTP_403_FORBIDDEN)
 
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
@@ -518,10 +563,8 @@ class ProjectRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
     def destroy(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
         project = get_object_or_404(Project, pk=pk)
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
+        if project.is_private and not resolve_access(request, project.workspace_id, project).project_member:
+            return Response(PROJECT_MEMBERS_ONLY, status=status.HTTP_403_FORBIDDEN)
 
         update = Update()
         update.workspace = project.workspace
@@ -543,18 +586,19 @@ class ProjectMemberListCreate(generics.ListCreateAPIView):
 
     def list(self, request, *args, **kwargs):
         project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
+        project = get_project(request, kwargs.get('workspace_id'), project_id)
 
         workspace_id = kwargs.get('workspace_id')
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
+        access = resolve_access(request, workspace_id, project)
+        if not access.is_member:
+            return Response(WORKSPACE_MEMBERS_ONLY, status=status.HTTP_403_FORBIDDEN)
 
         if not project.is_private:
             return Response({"message": "All workspace members have access to public project"},
                             status=status.HTTP_200_OK)
 
-        if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-            return Response({'error': 'Access restricted to project members only'}, status=status.HTTP_403_FORBIDDEN)
+        if not access.project_member:
+            return Response(PROJECT_MEMBERS_ONLY, status=status.HTTP_403_FORBIDDEN)
 
         member_queryset = ProjectMember.objects.filter(project=project)
         serializer = ProjectMemberSerializer(member_queryset, many=True)
@@ -562,61 +606,67 @@ class ProjectMemberListCreate(generics.ListCreateAPIView):
 
     def create(self, request, *args, **kwargs):
         project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
+        project = get_project(request, kwargs.get('workspace_id'), project_id)
 
         workspace_id = kwargs.get('workspace_id')
         workspace = get_object_or_404(Workspace, pk=workspace_id)
 
+        access = resolve_access(request, workspace.id, project)
         if not project.is_private:
-            if not TeamMember.objects.filter(member=request.user, workspace=workspace, role='admin').exists():
-                return Response({'error': 'Access restricted to workspace admins only'},
-                                status=status.HTTP_403_FORBIDDEN)
-        else:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
+            if not access.is_admin:
+                return Response(WORKSPACE_ADMINS_ONLY, status=status.HTTP_403_FORBIDDEN)
+        elif not access.project_member:
+            return Response(PROJECT_MEMBERS_ONLY, status=status.HTTP_403_FORBIDDEN)
 
         user_id = request.data.get('member', None)
         if user_id is None or not TeamMember.objects.filter(member_id=user_id, workspace=workspace).exists():
             return Response({'error': 'Invalid member id'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if ProjectMember.objects.filter(project=project, member_id=user_id).exists():
-            return Response({'error': 'Already added to the project'}, status=status.HTTP_400_BAD_REQUEST)
-
         user = get_object_or_404(PrismUser, pk=user_id)
 
         project_member = ProjectMember()
         project_member.project = project
         project_member.member = user
-        project_member.save()
+        try:
+            with transaction.atomic():
+                project_member.save()
+        except IntegrityError:
+            return Response({'error': 'Already added to the project'}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = ProjectMemberSerializer(project_member)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class ProjectMemberBulk(APIView):
+    permission_classes = [IsAuthenticated, CanManageProjectMembers]
+
+    def post(self, request, *args, **kwargs):
+        project = get_project(request, kwargs.get('workspace_id'), kwargs.get('project_id'))
+        add = request.data.get('add', [])
+        remove = request.data.get('remove', [])
+        if not isinstance(add, list) or not isinstance(remove, list):
+            return Response({'error': 'add and remove must be lists of member ids'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            added, rejected = add_project_members(project, add)
+            removed, invalid = remove_project_members(project, remove)
+
+        return Response({
+            'added': added,
+            'removed': removed,
+            'rejected': rejected + invalid,
+        }, status=status.HTTP_200_OK)
+
+
 class ProjectMemberDestroy(generics.DestroyAPIView):
     serializer_class = ProjectMemberSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, CanManageProjectMembers]
 
     def get_queryset(self):
         return ProjectMember.objects.all()
 
     def destroy(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-        workspace = get_object_or_404(Workspace, pk=workspace_id)
-
-        if not project.is_private:
-            if not TeamMember.objects.filter(member=request.user, workspace=workspace, role='admin').exists():
-                return Response({'error': 'Access restricted to workspace admins only'},
-                                status=status.HTTP_403_FORBIDDEN)
-        else:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         instance = self.get_object()
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -624,37 +674,29 @@ class ProjectMemberDestroy(generics.DestroyAPIView):
 
 class TaskListCreate(generics.ListCreateAPIView):
     serializer_class = TaskSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasProjectAccess]
 
     def get_queryset(self):
         return Task.objects.all()
 
     def create(self, request, *args, **kwargs):
         project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
+        project = get_project(request, kwargs.get('workspace_id'), project_id)
         request.data['project'] = project_id
 
         workspace_id = kwargs.get('workspace_id')
-        workspace = get_object_or_404(Workspace, pk=workspace_id)
-
-        if not project.is_private:
-            if not TeamMember.objects.filter(member=request.user, workspace=workspace).exists():
-                return Response({'error': 'Access restricted to workspace members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-        else:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
 
-        todo_task_count = Task.objects.filter(project=project, column='todo').aggregate(Count('id'))
-        request.data['index'] = todo_task_count['id__count']
+        with transaction.atomic():
+            # Same lock as move_task, so concurrent writes of the column never take the same key
+            Project.objects.select_for_update().filter(pk=project.id).first()
+            request.data['index'] = next_index(project.id, request.data.get('column', 'todo'))
 
-        serializer = TaskSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        instance = serializer.save()
+            serializer = TaskSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            instance = serializer.save()
 
         update = Update()
-        update.workspace = workspace
+        update.workspace_id = workspace_id
         update.message = f'Task {instance.name} for Project {project.name} created by {request.user.user_name}'
         update.save()
 
@@ -662,82 +704,140 @@ class TaskListCreate(generics.ListCreateAPIView):
 
     def list(self, request, *args, **kwargs):
         project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
+        project = get_project(request, kwargs.get('workspace_id'), project_id)
 
-        workspace_id = kwargs.get('workspace_id')
+        def build_response():
+            task_queryset = Task.objects.filter(project=project).order_by('column', 'index')
+            task_queryset = TaskSerializer.setup_eager_loading(task_queryset)
+            serializer = TaskSerializer(task_queryset, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
 
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
+        return conditional_response(request, f'tasks-{project.id}-{project.version}', build_response)
 
-        if project.is_private and not ProjectMember.objects.filter(project=project, member=request.user).exists():
-            return Response({'error': 'Access restricted to project members only'}, status=status.HTTP_403_FORBIDDEN)
 
-        task_queryset = Task.objects.filter(project=project).order_by('column', 'index')
-        serializer = TaskSerializer(task_queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+class TaskBatch(APIView):
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def post(self, request, *args, **kwargs):
+        project = get_project(request, kwargs.get('workspace_id'), kwargs.get('project_id'))
+        operations = request.data.get('operations', None) if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return Response({'error': 'Expected a list of operations'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return Response({'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        operations, errors = parse_task_batch(project, operations)
+        if any(errors):
+            return Response({'error': 'Invalid operations', 'operations': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        created, updated, deleted = apply_task_batch(project, request.user, operations)
+        tasks = TaskSerializer.setup_eager_loading(Task.objects.filter(id__in=[task.id for task in created + updated]))
+        tasks = {task['id']: task for task in TaskSerializer(tasks, many=True).data}
+        return Response({
+            'created': [tasks[task.id] for task in created],
+            'updated': [tasks[task.id] for task in updated],
+            'deleted': [task.id for task in deleted],
+        }, status=status.HTTP_200_OK)
+
+
+class ProjectBoard(APIView):
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, *args, **kwargs):
+        project = get_project(request, kwargs.get('workspace_id'), kwargs.get('project_id'))
+        return conditional_response(request, f'board-{project.id}-{project.version}',
+                                    lambda: Response(build_board(project), status=status.HTTP_200_OK))
+
+
+class ProjectStats(APIView):
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, *args, **kwargs):
+        project = get_project(request, kwargs.get('workspace_id'), kwargs.get('project_id'))
+
+        def build_response():
+            stats = summarise_task_stats([project.id])
+            stats['project'] = project.id
+            return Response(stats, status=status.HTTP_200_OK)
+
+        # Overdue counts change with the date even without writes
+        return conditional_response(request, f'stats-{project.id}-{project.version}-{timezone.localdate()}',
+                                    build_response)
+
+
+class ProjectSchedule(APIView):
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, *args, **kwargs):
+        project = get_project(request, kwargs.get('workspace_id'), kwargs.get('project_id'))
+        start = request.query_params.get('start')
+        if start is None:
+            start = datetime.combine(timezone.localdate(), time())
+        else:
+            try:
+                start = parse_datetime(start) or datetime.combine(parse_date(start), time())
+            except (TypeError, ValueError):
+                return Response({'error': 'Invalid start date'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+
+        def build_response():
+            try:
+                schedule = DependencyGraph.load(project).schedule(start)
+            except DependencyCycle as cycle:
+                return Response({'error': str(cycle), 'tasks': cycle.tasks}, status=status.HTTP_409_CONFLICT)
+            schedule['project'] = project.id
+            return Response(schedule, status=status.HTTP_200_OK)
+
+        return conditional_response(request, f'schedule-{project.id}-{project.version}-{start.isoformat()}',
+                                    build_response)
 
 
 class TaskRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = TaskSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasProjectAccess]
 
     def get_queryset(self):
+        if self.request.method in ('PUT', 'PATCH', 'DELETE'):
+            # Summary rows are moved from the values read here, concurrent writes of the task wait for each other
+            return Task.objects.select_for_update()
         return Task.objects.all()
 
     def retrieve(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
         task_id = kwargs.get('pk')
 
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         task = get_object_or_404(Task, pk=task_id)
         serializer = TaskSerializer(task)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def update(self, request, *args, **kwargs):
         project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
+        project = get_project(request, kwargs.get('workspace_id'), project_id)
         request.data['project'] = project_id
 
-        workspace_id = kwargs.get('workspace_id')
-
-        task_id = kwargs.get('pk')
-        task = get_object_or_404(Task, pk=task_id)
-
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
+        partial = kwargs.pop('partial', False)
         updated_column = request.data.get('column', None)
         updated_index = request.data.get('index', None)
-        if updated_column is not None and task.column != updated_column and updated_index is None:
-            task_column_index = Task.objects.filter(project=project, column=updated_column).aggregate(Count('id'))
-            request.data['index'] = task_column_index['id__count']
+        with transaction.atomic():
+            if updated_column is not None:
+                # Taken before the task row, in the order move_task takes them
+                Project.objects.select_for_update().filter(pk=project.id).first()
+            instance = self.get_object()
+            previous_column = instance.column
 
-        partial = kwargs.pop('partial', False)
-        instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=partial)
-        serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+            if updated_column is not None and previous_column != updated_column and updated_index is None:
+                request.data['index'] = next_index(project.id, updated_column, exclude=instance.id)
+
+            serializer = self.get_serializer(instance, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
 
         task_name = request.data.get('name', instance.name)
-        if updated_column is not None and task.column != updated_column:
+        if updated_column is not None and previous_column != updated_column:
             update = Update()
-            update.workspace = project.workspace
-            update.message = f'Task {task_name} moved from {task.column} to {updated_column} ' \
+            update.workspace_id = project.workspace_id
+            update.message = f'Task {task_name} moved from {previous_column} to {updated_column} ' \
                              f'by {request.user.user_name}'
             update.save()
 
@@ -745,61 +845,79 @@ class TaskRetrieveUpdateDelete(generics.RetrieveUpdateDestroyAPIView):
 
     def destroy(self, request, *args, **kwargs):
         project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
+        project = get_project(request, kwargs.get('workspace_id'), project_id)
 
-        workspace_id = kwargs.get('workspace_id')
+        with transaction.atomic():
+            instance = self.get_object()
 
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
+            update = Update()
+            update.workspace_id = project.workspace_id
+            update.message = f'Task {instance.name} deleted by {request.user.user_name}'
+            update.save()
 
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
+            self.perform_destroy(instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        instance = self.get_object()
 
-        update = Update()
-        update.workspace = project.workspace
-        update.message = f'Task {instance.name} deleted by {request.user.user_name}'
-        update.save()
+class TaskMove(APIView):
+    permission_classes = [IsAuthenticated, HasProjectAccess]
 
-        self.perform_destroy(instance)
-        return Response(status=status.HTTP_204_NO_CONTENT)
+    def post(self, request, *args, **kwargs):
+        project = get_project(request, kwargs.get('workspace_id'), kwargs.get('project_id'))
+        task = get_object_or_404(Task, pk=kwargs.get('pk'), project=project)
+        previous_column = task.column
+
+        column = request.data.get('column', task.column)
+        if column not in dict(Task.COLUMN_OPTIONS):
+            return Response({'error': 'Invalid column'}, status=status.HTTP_400_BAD_REQUEST)
+
+        anchors = {}
+        for position in ('before', 'after'):
+            anchor_id = request.data.get(position, None)
+            if anchor_id is None:
+                continue
+            anchor = Task.objects.filter(pk=anchor_id, project=project).exclude(pk=task.id).first()
+            if anchor is None:
+                return Response({'error': f'Invalid {position} task id'}, status=status.HTTP_400_BAD_REQUEST)
+            anchors[position] = anchor
+        if len(anchors) > 1:
+            return Response({'error': 'Provide either before or after, not both'}, status=status.HTTP_400_BAD_REQUEST)
+
+        move_task(task, column, **anchors)
+
+        if task.column != previous_column:
+            update = Update()
+            update.workspace_id = project.workspace_id
+            update.message = f'Task {task.name} moved from {previous_column} to {task.column} ' \
+                             f'by {request.user.user_name}'
+            update.save()
+
+        serializer = TaskSerializer(task)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 class TaskMemberListCreate(generics.ListCreateAPIView):
     serializer_class = TaskMemberSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasProjectAccess]
 
     def get_queryset(self):
         return TaskMember.objects.all()
 
     def list(self, request, *args, **kwargs):
         project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
+        project = get_project(request, kwargs.get('workspace_id'), project_id)
         request.data['project'] = project_id
 
-        workspace_id = kwargs.get('workspace_id')
-
         task_id = kwargs.get('task_id')
         task = get_object_or_404(Task, pk=task_id)
 
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         member_queryset = TaskMember.objects.filter(task=task)
         serializer = TaskMemberSerializer(member_queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
         project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
+        project = get_project(request, kwargs.get('workspace_id'), project_id)
         request.data['project'] = project_id
 
         workspace_id = kwargs.get('workspace_id')
@@ -807,14 +925,6 @@ class TaskMemberListCreate(generics.ListCreateAPIView):
         task_id = kwargs.get('task_id')
         task = get_object_or_404(Task, pk=task_id)
 
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         user_id = request.data.get('member', None)
         if user_id is None or not TeamMember.objects.filter(member_id=user_id, workspace_id=workspace_id).exists():
             return Response({'error': 'Invalid member id'}, status=status.HTTP_400_BAD_REQUEST)
@@ -824,15 +934,16 @@ class TaskMemberListCreate(generics.ListCreateAPIView):
                 return Response({'error': 'Added user is not a member of the project'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-        if TaskMember.objects.filter(task_id=task_id, member_id=user_id).exists():
-            return Response({'error': 'User already assigned to the task'}, status=status.HTTP_400_BAD_REQUEST)
-
         user = get_object_or_404(PrismUser, pk=user_id)
 
         task_member = TaskMember()
         task_member.member = user
         task_member.task = task
-        task_member.save()
+        try:
+            with transaction.atomic():
+                task_member.save()
+        except IntegrityError:
+            return Response({'error': 'User already assigned to the task'}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = TaskMemberSerializer(task_member)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -840,25 +951,12 @@ class TaskMemberListCreate(generics.ListCreateAPIView):
 
 class TaskMemberDestroy(generics.DestroyAPIView):
     serializer_class = TaskMemberSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasProjectAccess]
 
     def get_queryset(self):
         return TaskMember.objects.all()
 
     def destroy(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         instance = self.get_object()
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -866,91 +964,78 @@ class TaskMemberDestroy(generics.DestroyAPIView):
 
 class TaskDependencyListCreate(generics.ListCreateAPIView):
     serializer_class = TaskDependencySerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasProjectAccess]
 
     def get_queryset(self):
         return TaskDependency.objects.all()
 
     def list(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-
         task_id = kwargs.get('task_id')
         task = get_object_or_404(Task, pk=task_id)
 
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         dependency_queryset = TaskDependency.objects.filter(task=task)
         serializer = TaskDependencySerializer(dependency_queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
         project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-
         task_id = kwargs.get('task_id')
-        task = get_object_or_404(Task, pk=task_id)
-
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
+        task = get_object_or_404(Task, pk=task_id, project_id=project_id)
 
         dependency_id = request.data.get('dependency', None)
-        if dependency_id is None or not Task.objects.filter(id=dependency_id, project_id=project_id).exists():
+        dependency = Task.objects.filter(id=dependency_id, project_id=project_id).first() \
+            if str(dependency_id).isdigit() else None
+        if dependency is None:
             return Response({'error': 'Invalid dependency id'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if task_id == dependency_id:
+        if task.id == dependency.id:
             return Response({'error': 'A task cannot be dependent on itself'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if TaskDependency.objects.filter(task_id=task_id, dependency_id=dependency_id).exists():
-            return Response({'error': 'Already added as a dependency to the task'}, status=status.HTTP_400_BAD_REQUEST)
-
-        dependency = get_object_or_404(Task, pk=dependency_id)
+        with transaction.atomic():
+            # Dependency writes of a project are serialised, so two concurrent inserts cannot close a cycle together
+            project = Project.objects.select_for_update().get(pk=project_id)
+            cycle = DependencyGraph.load(project).depends_on(dependency.id, task.id)
+            if cycle is not None:
+                return Response({'error': 'The dependency would create a cycle', 'cycle': cycle + [dependency.id]},
+                                status=status.HTTP_400_BAD_REQUEST)
 
-        dependency_task = TaskDependency()
-        dependency_task.dependency = dependency
-        dependency_task.task = task
-        dependency_task.save()
+            dependency_task = TaskDependency()
+            dependency_task.dependency = dependency
+            dependency_task.task = task
+            try:
+                with transaction.atomic():
+                    dependency_task.save()
+            except IntegrityError:
+                return Response({'error': 'Already added as a dependency to the task'},
+                                status=status.HTTP_400_BAD_REQUEST)
 
         serializer = TaskDependencySerializer(dependency_task)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class TaskBlocking(APIView):
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, *args, **kwargs):
+        task = get_object_or_404(Task, pk=kwargs.get('task_id'), project_id=kwargs.get('project_id'))
+        upstream = list(TaskClosure.objects.filter(downstream=task).values_list('upstream_id', 'upstream__column'))
+        downstream = TaskClosure.objects.filter(upstream=task).values_list('downstream_id', flat=True)
+        return Response({
+            'task': task.id,
+            'upstream': [task_id for task_id, _ in upstream],
+            'downstream': list(downstream),
+            'blocked': any(column != 'complete' for _, column in upstream),
+        }, status=status.HTTP_200_OK)
+
+
 class TaskDependencyDestroy(generics.DestroyAPIView):
     serializer_class = TaskDependencySerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasProjectAccess]
 
     def get_queryset(self):
         return TaskDependency.objects.all()
 
     def destroy(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         instance = self.get_object()
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -958,49 +1043,23 @@ class TaskDependencyDestroy(generics.DestroyAPIView):
 
 class SubTaskListCreate(generics.ListCreateAPIView):
     serializer_class = SubTaskSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasProjectAccess]
 
     def get_queryset(self):
         return SubTask.objects.all()
 
     def list(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-
         task_id = kwargs.get('task_id')
         task = get_object_or_404(Task, pk=task_id)
 
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         subtask_queryset = SubTask.objects.filter(task=task)
         serializer = SubTaskSerializer(subtask_queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-
         task_id = kwargs.get('task_id')
         task = get_object_or_404(Task, pk=task_id)
 
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         subtask_name = request.data.get("name")
         if subtask_name is None:
             return Response({'error': 'Invalid subtask name'}, status=status.HTTP_400_BAD_REQUEST)
@@ -1015,45 +1074,65 @@ class SubTaskListCreate(generics.ListCreateAPIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class SubTaskBulk(APIView):
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def post(self, request, *args, **kwargs):
+        project = get_project(request, kwargs.get('workspace_id'), kwargs.get('project_id'))
+        task = get_object_or_404(Task, pk=kwargs.get('task_id'), project=project)
+
+        create = request.data.get('create', [])
+        done = request.data.get('done', [])
+        undone = request.data.get('undone', [])
+        if not all(isinstance(values, list) for values in (create, done, undone)):
+            return Response({'error': 'create, done and undone must be lists'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = SubTaskSerializer(data=[{'name': item} if isinstance(item, str) else item for item in create],
+                                       many=True)
+        if not serializer.is_valid():
+            return Response({'error': 'Invalid subtasks', 'create': serializer.errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        done, rejected = split_ids(done)
+        undone, invalid = split_ids(undone)
+        rejected += invalid
+        if set(done) & set(undone):
+            return Response({'error': 'A subtask cannot be both done and undone'}, status=status.HTTP_400_BAD_REQUEST)
+        subtask_ids = set(SubTask.objects.filter(task=task, id__in=done + undone).values_list('id', flat=True))
+        rejected += [subtask_id for subtask_id in done + undone if subtask_id not in subtask_ids]
+
+        with transaction.atomic():
+            SubTask.objects.bulk_create([SubTask(task=task, name=subtask['name'], status=subtask.get('status', False))
+                                         for subtask in serializer.validated_data])
+            SubTask.objects.filter(task=task, id__in=done).update(status=True)
+            SubTask.objects.filter(task=task, id__in=undone).update(status=False)
+            refresh_subtask_progress([task.id])
+            touch_project(pk=project.id)
+            publish_event(project.workspace_id, 'task', {'id': task.id, 'project': project.id, 'changed': 'SubTask'})
+
+        task.refresh_from_db(fields=['subtasks_done', 'subtasks_total'])
+        subtasks = SubTask.objects.filter(task=task).order_by('id')
+        return Response({
+            'subtasks': SubTaskSerializer(subtasks, many=True).data,
+            'subtasks_done': task.subtasks_done,
+            'subtasks_total': task.subtasks_total,
+            'rejected': rejected,
+        }, status=status.HTTP_200_OK)
+
+
 class SubTaskRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = SubTaskSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasProjectAccess]
 
     def get_queryset(self):
         return SubTask.objects.all()
 
     def retrieve(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         subtask = self.get_object()
         serializer = SubTaskSerializer(subtask)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def update(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
@@ -1062,19 +1141,6 @@ class SubTaskRetrieveUpdateDestroy(generics.RetrieveUpdateDestroyAPIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
-        project_id = kwargs.get('project_id')
-        project = get_object_or_404(Project, pk=project_id)
-
-        workspace_id = kwargs.get('workspace_id')
-
-        if not TeamMember.objects.filter(member=request.user, workspace_id=workspace_id).exists():
-            return Response({'error': 'Access restricted to workspace members only'}, status=status.HTTP_403_FORBIDDEN)
-
-        if project.is_private:
-            if not ProjectMember.objects.filter(project=project, member=request.user).exists():
-                return Response({'error': 'Access restricted to project members only'},
-                                status=status.HTTP_403_FORBIDDEN)
-
         instance = self.get_object()
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1085,8 +1151,28 @@ class WorkspaceImageUpload(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
     def post(self, request, format=None):
+        handler = ImageUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
+        image = request.FILES.get('image')
+        if handler.too_large:
+            return Response({'error': f'Image exceeds {settings.IMAGE_MAX_UPLOAD_SIZE} bytes'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if image is None:
+            return Response({'image': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Identical images are stored once
+        existing = WorkspaceImage.objects.filter(digest=image.sha256).first()
+        if existing is not None:
+            return Response(WorkspaceImageSerializer(existing).data, status=status.HTTP_200_OK)
+
         serializer = WorkspaceImageSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                with transaction.atomic():
+                    serializer.save(digest=image.sha256)
+            except IntegrityError:
+                existing = WorkspaceImage.objects.get(digest=image.sha256)
+                return Response(WorkspaceImageSerializer(existing).data, status=status.HTTP_200_OK)
+            # Variants are made by the process_workspace_images worker
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
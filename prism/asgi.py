@@ -13,4 +13,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prism.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.events import EventStreamRouter  # noqa: E402
+
+application = EventStreamRouter(django_application)
@@ -0,0 +1,91 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import LazyObject, empty
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current_request = ContextVar('prism_current_request', default=None)
+
+
+def pin_cache_key(user_id):
+    return f'prism:db:pin:{user_id}'
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+def _resolved_user(request):
+    # request.user is loaded lazily from the session, evaluating it here would route the reads of its own loading
+    user = request.__dict__.get('user')
+    if isinstance(user, LazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+def _is_pinned(request):
+    pinned = getattr(request, '_prism_db_pinned', None)
+    if pinned is None:
+        if request.method not in SAFE_METHODS:
+            pinned = True
+        else:
+            user = _resolved_user(request)
+            if user is None:
+                # Authentication reads the session and the user from the primary, so that fresh logins are found
+                return True
+            if not user.is_authenticated:
+                return False
+            pinned = bool(cache.get(pin_cache_key(user.id)))
+        request._prism_db_pinned = pinned
+    return pinned
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of safe requests to a replica, everything else to the primary.
+    A user who has just written is pinned to the primary for REPLICA_PIN_SECONDS, so they read their own writes
+    even while the replicas lag behind. Reads outside of a request (commands, workers) use the primary.
+    """
+
+    def __init__(self, replicas=None):
+        self.replicas = replica_aliases() if replicas is None else replicas
+
+    def db_for_read(self, model, **hints):
+        request = _current_request.get()
+        if request is None or not self.replicas or _is_pinned(request):
+            return 'default'
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        request = _current_request.get()
+        if request is not None:
+            request._prism_db_pinned = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and user is not None \
+                and user.is_authenticated:
+            cache.set(pin_cache_key(user.id), True, settings.REPLICA_PIN_SECONDS)
+        return response
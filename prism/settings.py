@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
-from decouple import config
+from decouple import config, Csv
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -82,12 +82,61 @@ WSGI_APPLICATION = 'prism.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_ENGINE selects 'sqlite' (default, small deployments) or 'postgresql'
+DATABASE_ENGINE = config('DATABASE_ENGINE', default='sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    # Set DATABASE_POOLER when connecting through a transaction pooling PgBouncer
+    DATABASE_POOLER = config('DATABASE_POOLER', default=False, cast=bool)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DATABASE_NAME', default='prism'),
+            'USER': config('DATABASE_USER', default='prism'),
+            'PASSWORD': config('DATABASE_PASSWORD', default=''),
+            'HOST': config('DATABASE_HOST', default='localhost'),
+            'PORT': config('DATABASE_PORT', default=6432 if DATABASE_POOLER else 5432, cast=int),
+            # Persistent connections, reused across requests for this many seconds
+            'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=60, cast=int),
+            # Server side cursors do not survive a pooler handing the connection to another client between queries
+            'DISABLE_SERVER_SIDE_CURSORS': DATABASE_POOLER,
+            'OPTIONS': {
+                'connect_timeout': config('DATABASE_CONNECT_TIMEOUT', default=5, cast=int),
+                'sslmode': config('DATABASE_SSLMODE', default='prefer'),
+            },
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # Seconds a writer waits for the database lock before failing with "database is locked"
+                'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+            },
+        }
+    }
+
+# Write-ahead logging lets readers proceed while a write is in progress (applied when a connection opens)
+SQLITE_WAL = config('SQLITE_WAL', default=True, cast=bool)
+
+# Read replicas, comma separated hosts (PostgreSQL) or database files (SQLite). Safe requests read from a replica,
+# except for users who wrote within the last REPLICA_PIN_SECONDS; the pins live in the cache, so a shared cache is
+# needed for them to hold across worker processes.
+DATABASE_REPLICAS = config('DATABASE_REPLICAS', default='', cast=Csv())
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
+for number, replica in enumerate(DATABASE_REPLICAS, start=1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST' if DATABASE_ENGINE == 'postgresql' else 'NAME': replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['prism.routers.ReplicaRouter']
+    MIDDLEWARE.append('prism.routers.ReplicaPinningMiddleware')
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -169,5 +218,37 @@ SIMPLE_JWT = {
 MEDIA_ROOT = os.path.join(BASE_DIR, 'uploads')
 MEDIA_URL = '/uploads/'
 
+EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
+EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default=EMAIL_HOST_USER or 'noreply@prism.local')
+# Seconds a queued email stays reserved for the worker that picked it up
+EMAIL_LEASE_SECONDS = config('EMAIL_LEASE_SECONDS', default=300, cast=int)
+
+# Dotted path of the broker fanning out workspace events to the ASGI event streams
+EVENT_BROKER = config('EVENT_BROKER', default='core.broker.InMemoryBroker')
+EVENT_KEEPALIVE_SECONDS = config('EVENT_KEEPALIVE_SECONDS', default=15, cast=int)
+
+# Seconds a project dependency graph stays cached, graphs are keyed on the project version so writes never see stale ones
+GRAPH_CACHE_TIMEOUT = config('GRAPH_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seconds a resolved workspace role / project membership may be reused across requests (0 disables the cache)
+ACCESS_CACHE_TIMEOUT = config('ACCESS_CACHE_TIMEOUT', default=0, cast=int)
+
+# Seconds a workspace member directory stays cached. A member or name change moves the workspace to a new cache key,
+# which only reaches other worker processes through a shared cache (CACHES), not the default per process LocMemCache
+DIRECTORY_CACHE_TIMEOUT = config('DIRECTORY_CACHE_TIMEOUT', default=86400, cast=int)
+
+# Uploaded workspace images: largest accepted file in bytes and image in pixels, and seconds a worker may hold an
+# image before another one retries it
+IMAGE_MAX_UPLOAD_SIZE = config('IMAGE_MAX_UPLOAD_SIZE', default=10 * 1024 * 1024, cast=int)
+IMAGE_MAX_PIXELS = config('IMAGE_MAX_PIXELS', default=40_000_000, cast=int)
+IMAGE_LEASE_SECONDS = config('IMAGE_LEASE_SECONDS', default=300, cast=int)
+
+# How uploads are sent: 'django' (FileResponse, sendfile() where the WSGI server supports it), 'x-accel-redirect'
+# (nginx, with an internal location at MEDIA_ACCEL_REDIRECT_PREFIX aliased to MEDIA_ROOT) or 'x-sendfile' (Apache)
+MEDIA_SERVER = config('MEDIA_SERVER', default='django')
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/protected-uploads/')
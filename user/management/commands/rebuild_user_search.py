@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from user.models import PrismUser
+from user.search import index_users
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the user search terms, for users written without signals (bulk imports, raw SQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = PrismUser.objects.order_by('id')
+        last_id, indexed = 0, 0
+        while True:
+            batch = list(users.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            index_users(batch)
+            last_id = batch[-1].id
+            indexed += len(batch)
+        self.stdout.write(f'{indexed} user(s) indexed')
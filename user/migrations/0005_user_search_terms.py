@@ -0,0 +1,51 @@
+# Generated by Django 3.2.5 on 2026-10-18 08:20
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Copies of user.search as of this migration
+SEARCH_FIELDS = ('user_name', 'first_name', 'last_name', 'email')
+TERM_LENGTH = 127
+
+_separators = re.compile(r'[\W_]+')
+
+
+def split_terms(text):
+    return [term[:TERM_LENGTH] for term in _separators.split((text or '').casefold()) if term]
+
+
+def index_users(apps, schema_editor):
+    PrismUser = apps.get_model('user', 'PrismUser')
+    UserSearchTerm = apps.get_model('user', 'UserSearchTerm')
+    UserSearchTerm.objects.bulk_create([
+        UserSearchTerm(user_id=user['id'], field=field, term=term)
+        for user in PrismUser.objects.values('id', *SEARCH_FIELDS).iterator()
+        for field in SEARCH_FIELDS for term in set(split_terms(user[field]))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_alter_prismuser_password'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=15)),
+                ('term', models.CharField(max_length=127)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='usersearchterm',
+            index=models.Index(fields=['term', 'field', 'user'], name='user_search_term_idx'),
+        ),
+        migrations.RunPython(index_users, migrations.RunPython.noop),
+    ]
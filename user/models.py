@@ -52,3 +52,14 @@ class PrismUser(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.first_name + ' ' + self.last_name
+
+
+class UserSearchTerm(models.Model):
+    user = models.ForeignKey(PrismUser, on_delete=models.CASCADE, related_name='search_terms')
+    field = models.CharField(max_length=15)
+    term = models.CharField(max_length=127)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'field', 'user'], name='user_search_term_idx'),
+        ]
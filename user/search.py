@@ -0,0 +1,73 @@
+import re
+
+from django.db import transaction
+from django.db.models import Case, When, Value, Max, F, Q, IntegerField
+
+from user.models import PrismUser, UserSearchTerm
+
+# Matches in user names rank above names, which rank above emails; an exact term adds one
+SEARCH_FIELDS = {'user_name': 4, 'first_name': 3, 'last_name': 3, 'email': 2}
+SEARCH_MAX_TERMS = 6
+# Shorter terms match whole terms only, a one letter prefix would rank a large share of the index
+SEARCH_MIN_PREFIX = 2
+TERM_LENGTH = 127
+
+_separators = re.compile(r'[\W_]+')
+
+
+def split_terms(text):
+    return [term[:TERM_LENGTH] for term in _separators.split((text or '').casefold()) if term]
+
+
+def user_search_terms(user):
+    return {(field, term) for field in SEARCH_FIELDS for term in split_terms(getattr(user, field))}
+
+
+def index_users(users):
+    users = list(users)
+    with transaction.atomic():
+        UserSearchTerm.objects.filter(user__in=users).delete()
+        UserSearchTerm.objects.bulk_create([
+            UserSearchTerm(user=user, field=field, term=term)
+            for user in users for field, term in user_search_terms(user)
+        ], batch_size=1000)
+
+
+def _prefix(term):
+    if len(term) < SEARCH_MIN_PREFIX:
+        return Q(term=term)
+    # Every string starting with `term` sorts in [term, upper), a range the term index answers directly
+    upper = term[:-1] + chr(ord(term[-1]) + 1)
+    return Q(term__gte=term, term__lt=upper)
+
+
+def search_users(criteria, members=None):
+    """
+    Ranked prefix search over the term index. `criteria` are (field, text) pairs, field None for any field; every
+    term of every criterion has to match, terms shorter than SEARCH_MIN_PREFIX as a whole. Returns rows of user_id
+    and rank, best first, to be sliced into pages. `members` optionally restricts the search to a queryset of user
+    ids.
+    """
+    terms = [(field, term) for field, text in criteria for term in split_terms(text)][:SEARCH_MAX_TERMS]
+    if not terms:
+        return UserSearchTerm.objects.none().values('user_id')
+
+    rows = UserSearchTerm.objects.filter(Q(*[_prefix(term) for _, term in terms], _connector=Q.OR))
+    if members is not None:
+        rows = rows.filter(user_id__in=members)
+    ranks = {}
+    for number, (field, term) in enumerate(terms):
+        weights = SEARCH_FIELDS if field is None else {field: SEARCH_FIELDS[field]}
+        ranks[f'rank{number}'] = Max(Case(
+            *[When(field=name, term=term, then=Value(weight + 1)) for name, weight in weights.items()],
+            *[When(_prefix(term), field=name, then=Value(weight)) for name, weight in weights.items()],
+            default=Value(0), output_field=IntegerField(),
+        ))
+
+    rows = rows.order_by().values('user_id').annotate(**ranks).filter(**{f'{name}__gt': 0 for name in ranks})
+    return rows.annotate(rank=sum((F(name) for name in ranks), Value(0))).order_by('-rank', 'user_id')
+
+
+def users_in_order(rows):
+    users = PrismUser.objects.in_bulk([row['user_id'] for row in rows])
+    return [users[row['user_id']] for row in rows if row['user_id'] in users]
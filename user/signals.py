@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from user.models import PrismUser
+from user.search import SEARCH_FIELDS, index_users
+
+
+@receiver(post_save, sender=PrismUser)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Logins only save last_login
+    if update_fields is None or not SEARCH_FIELDS.keys().isdisjoint(update_fields):
+        index_users([instance])
@@ -1,3 +1,70 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from core.models import Workspace, TeamMember
+from user.models import PrismUser
+
+
+def create_user(user_name, first_name='Test', last_name='User', email=None):
+    return PrismUser.objects.create_user(email or f'{user_name}@prism.test', user_name, first_name, last_name, '', '',
+                                         'password123')
+
+
+class UserSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.searcher = create_user('searcher')
+        cls.exact = create_user('ann', 'Zed')
+        cls.prefix = create_user('annabel')
+        cls.first_name = create_user('zoe', 'Anna')
+        cls.email = create_user('lee', email='ann.lee@mail.test')
+        cls.other = create_user('bob', 'Bob', 'Brown')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.searcher)
+
+    def search(self, **params):
+        return self.client.get('/api/user/search/', params)
+
+    def ids(self, response):
+        return [user['id'] for user in response.data]
+
+    def test_matches_are_ranked_by_field_and_exactness(self):
+        response = self.search(q='Ann')
+        self.assertEqual(self.ids(response), [self.exact.id, self.prefix.id, self.first_name.id, self.email.id])
+
+    def test_every_term_has_to_match(self):
+        self.assertEqual(self.ids(self.search(q='ann lee')), [self.email.id])
+        self.assertEqual(self.ids(self.search(first_name='an')), [self.first_name.id])
+        self.assertEqual(self.ids(self.search(user_name='ann', email='mail')), [])
+
+    def test_single_letters_match_whole_terms_only(self):
+        initial = create_user('initial', 'A', 'Smith')
+        self.assertEqual(self.ids(self.search(q='a')), [initial.id])
+        self.assertEqual(self.ids(self.search(q='a smi')), [initial.id])
+
+    def test_index_follows_profile_changes(self):
+        self.other.last_name = 'Annett'
+        self.other.save()
+        self.assertIn(self.other.id, self.ids(self.search(last_name='annet')))
+        self.assertEqual(self.ids(self.search(q='brown')), [])
+
+    def test_results_are_paginated(self):
+        response = self.search(q='ann', limit=3)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response['X-Next-Offset'], '3')
+        response = self.search(q='ann', limit=3, offset=3)
+        self.assertEqual(self.ids(response), [self.email.id])
+        self.assertFalse(response.has_header('Link'))
+
+    def test_search_can_be_scoped_to_workspace_members(self):
+        workspace = Workspace.objects.create(name='Prism', owner=self.searcher)
+        TeamMember.objects.create(workspace=workspace, member=self.searcher, role='admin')
+        TeamMember.objects.create(workspace=workspace, member=self.prefix, role='member')
+        self.assertEqual(self.ids(self.search(q='ann', workspace=workspace.id)), [self.prefix.id])
+        self.assertEqual(self.ids(self.search(workspace=workspace.id)), [self.prefix.id, self.searcher.id])
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.search(q='ann', workspace=workspace.id).status_code, 403)
@@ -1,11 +1,15 @@
+from django.db.models import F
 from django.shortcuts import get_object_or_404
-from django_filters.rest_framework import DjangoFilterBackend, FilterSet, CharFilter
-from rest_framework import status, filters
+from rest_framework import status
 from rest_framework.generics import CreateAPIView, RetrieveUpdateDestroyAPIView, ListAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from core.models import TeamMember
+from core.pagination import OffsetPagination
+from core.permissions import resolve_access, WORKSPACE_MEMBERS_ONLY
 from user.models import PrismUser
+from user.search import SEARCH_FIELDS, split_terms, search_users, users_in_order
 from user.serializers import CustomUserSerializer
 
 
@@ -44,21 +48,32 @@ class CustomUserDetail(RetrieveUpdateDestroyAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class UserFilter(FilterSet):
-    user_name = CharFilter(field_name='user_name', lookup_expr='icontains')
-    email = CharFilter(field_name='email', lookup_expr='icontains')
-    first_name = CharFilter(field_name='first_name', lookup_expr='icontains')
-    last_name = CharFilter(field_name='last_name', lookup_expr='icontains')
-
-    class Meta:
-        model = PrismUser
-        fields = ['user_name', 'email', 'first_name', 'last_name']
-
-
 class CustomUserSearch(ListAPIView):
+    """
+    Ranked prefix search of users: `?q=` matches any field, `?user_name=`, `?email=`, `?first_name=` and
+    `?last_name=` a single one. `?workspace=` restricts the results to the members of a workspace.
+    """
     permission_classes = [IsAuthenticated]
     serializer_class = CustomUserSerializer
-    queryset = PrismUser.objects.all()
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter,)
-    filter_class = UserFilter
-    filter_fields = ('user_name', 'email', 'first_name', 'last_name')
+    pagination_class = OffsetPagination
+
+    def list(self, request, *args, **kwargs):
+        members = None
+        workspace_id = request.query_params.get('workspace')
+        if workspace_id is not None:
+            if not workspace_id.isdigit():
+                return Response({'error': 'Invalid workspace id'}, status=status.HTTP_400_BAD_REQUEST)
+            if not resolve_access(request, int(workspace_id)).is_member:
+                return Response(WORKSPACE_MEMBERS_ONLY, status=status.HTTP_403_FORBIDDEN)
+            members = TeamMember.objects.filter(workspace_id=workspace_id).values('member_id')
+
+        criteria = [(None, request.query_params.get('q'))]
+        criteria += [(field, request.query_params[field]) for field in SEARCH_FIELDS if field in request.query_params]
+        if any(split_terms(text) for _, text in criteria):
+            rows = search_users(criteria, members)
+        else:
+            users = PrismUser.objects.all() if members is None else PrismUser.objects.filter(id__in=members)
+            rows = users.order_by('user_name').values(user_id=F('id'))
+
+        users = users_in_order(self.paginate_queryset(rows))
+        return self.get_paginated_response(self.get_serializer(users, many=True).data)